@@ -0,0 +1,41 @@
+# attendance/marking.py
+from django.db import connections, transaction
+
+from .models import Attendance
+
+
+def _upsert_options(using):
+    """bulk_create options that update is_present on a (session, user) conflict"""
+    options = {'update_conflicts': True, 'update_fields': ['is_present']}
+    # MySQL upserts on any unique key and rejects an explicit conflict target
+    if connections[using].features.supports_update_conflicts_with_target:
+        options['unique_fields'] = ['session', 'user']
+    return options
+
+
+def mark_users(session, user_ids, is_present=True):
+    """Create or update attendance for many users of a session in one statement"""
+    rows = [
+        Attendance(session=session, user_id=user_id, is_present=is_present)
+        for user_id in dict.fromkeys(user_ids)
+    ]
+    if not rows:
+        return 0
+
+    using = Attendance.objects.db
+    with transaction.atomic(using=using):
+        Attendance.objects.bulk_create(rows, **_upsert_options(using))
+    return len(rows)
+
+
+def mark_absent_users(session):
+    """Record every target user without an attendance row as absent; returns how many were added"""
+    present_users = session.attendances.values_list('user_id', flat=True)
+    absent_user_ids = list(session.target_users.exclude(id__in=present_users).values_list('id', flat=True))
+
+    # A row created concurrently (e.g. by a late recognition) wins over "absent"
+    Attendance.objects.bulk_create(
+        [Attendance(session=session, user_id=user_id, is_present=False) for user_id in absent_user_ids],
+        ignore_conflicts=True
+    )
+    return len(absent_user_ids)
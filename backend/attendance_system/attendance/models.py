@@ -1,5 +1,7 @@
 import uuid
 from django.db import models
+from django.dispatch import receiver
+from django.db.models.signals import m2m_changed, post_delete
 from users.models import User
 
 class AttendanceSession(models.Model):
@@ -40,4 +42,26 @@ class Attendance(models.Model):
 
     def __str__(self):
         status = "Present" if self.is_present else "Absent"
-        return f"{self.user.name} - {self.session.name} - {status}"
\ No newline at end of file
+        return f"{self.user.name} - {self.session.name} - {status}"
+
+
+@receiver(m2m_changed, sender=AttendanceSession.target_users.through)
+def invalidate_session_candidates(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+
+    from camera.session_candidates import session_candidates
+    if not reverse:
+        session_candidates.invalidate(instance.pk)
+    elif pk_set:
+        for session_id in pk_set:
+            session_candidates.invalidate(session_id)
+    else:
+        # user.sessions.clear() does not say which sessions changed
+        session_candidates.invalidate()
+
+
+@receiver(post_delete, sender=AttendanceSession)
+def forget_session_candidates(sender, instance, **kwargs):
+    from camera.session_candidates import session_candidates
+    session_candidates.invalidate(instance.pk)
@@ -1,3 +1,56 @@
+from datetime import date
+
 from django.test import TestCase
+from django.utils import timezone
+
+from users.models import User
+from .marking import mark_absent_users, mark_users
+from .models import Attendance, AttendanceSession
+
+
+class MarkingTests(TestCase):
+    def setUp(self):
+        # bulk_create skips the post_save signal that creates media folders
+        self.alice, self.bob, self.carol = User.objects.bulk_create([
+            User(email=f'{name}@example.com', name=name) for name in ('alice', 'bob', 'carol')
+        ])
+        self.session = AttendanceSession.objects.create(
+            name='Lecture', session_date=date(2026, 10, 17), start_time=timezone.now()
+        )
+        self.session.target_users.set([self.alice, self.bob, self.carol])
+
+    def attendance(self):
+        return {
+            str(user_id): is_present
+            for user_id, is_present in self.session.attendances.values_list('user_id', 'is_present')
+        }
+
+    def test_mark_users_creates_one_row_per_user(self):
+        marked = mark_users(self.session, [self.alice.id, self.bob.id, self.alice.id])
+
+        self.assertEqual(marked, 2)
+        self.assertEqual(self.attendance(), {str(self.alice.id): True, str(self.bob.id): True})
+
+    def test_mark_users_updates_existing_rows_in_place(self):
+        Attendance.objects.create(session=self.session, user=self.alice, is_present=False)
+        row_id = Attendance.objects.get(session=self.session, user=self.alice).id
+
+        mark_users(self.session, [self.alice.id, self.bob.id], is_present=True)
+
+        self.assertEqual(self.attendance(), {str(self.alice.id): True, str(self.bob.id): True})
+        self.assertEqual(Attendance.objects.get(session=self.session, user=self.alice).id, row_id)
+
+    def test_mark_users_with_no_users_does_nothing(self):
+        self.assertEqual(mark_users(self.session, []), 0)
+        self.assertEqual(self.attendance(), {})
+
+    def test_mark_absent_users_only_fills_in_missing_rows(self):
+        mark_users(self.session, [self.alice.id])
+
+        added = mark_absent_users(self.session)
 
-# Create your tests here.
+        self.assertEqual(added, 2)
+        self.assertEqual(self.attendance(), {
+            str(self.alice.id): True, str(self.bob.id): False, str(self.carol.id): False
+        })
+        self.assertEqual(mark_absent_users(self.session), 0)
@@ -1,8 +1,11 @@
 from rest_framework import viewsets, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.core.exceptions import ValidationError
 from django.http import JsonResponse
+from django.db import transaction
 from django.utils import timezone
+from .marking import mark_absent_users, mark_users
 from .models import AttendanceSession, Attendance
 from .serializers import AttendanceSessionSerializer, AttendanceSerializer
 from users.models import User
@@ -22,29 +25,44 @@ class AttendanceSessionViewSet(viewsets.ModelViewSet):
             return Response({"error": "Cannot mark attendance for a finished session"}, status=400)
         
         try:
-            user_id = request.data.get('user_id')
+            user_ids = request.data.get('user_ids')
             is_present = request.data.get('is_present', True)
             
-            user = User.objects.get(id=user_id)
+            if user_ids is None:
+                user_ids = [request.data.get('user_id')]
+            elif not isinstance(user_ids, list) or not user_ids:
+                return Response({"error": "user_ids must be a non-empty list"}, status=400)
+            user_ids = [str(user_id) for user_id in user_ids]
             
-            # Ensure user is in target users
-            if user not in session.target_users.all():
-                return Response({"error": "User not in target users for this session"}, status=400)
+            existing_ids = set(str(user_id) for user_id in User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+            missing_ids = [user_id for user_id in user_ids if user_id not in existing_ids]
+            if missing_ids:
+                return Response({"error": "User not found", "user_ids": missing_ids}, status=404)
             
-            # Create or update attendance record
-            attendance, created = Attendance.objects.update_or_create(
-                session=session,
-                user=user,
-                defaults={'is_present': is_present}
-            )
+            # Ensure users are in target users
+            target_ids = set(str(user_id) for user_id in session.target_users.filter(id__in=user_ids).values_list('id', flat=True))
+            outside_ids = [user_id for user_id in user_ids if user_id not in target_ids]
+            if outside_ids:
+                return Response({"error": "User not in target users for this session", "user_ids": outside_ids}, status=400)
+            
+            # Create or update all attendance records in one statement
+            mark_users(session, user_ids, is_present=is_present)
+            
+            attendances = Attendance.objects.filter(session=session, user_id__in=user_ids).select_related('user')
+            if 'user_ids' not in request.data:
+                return Response({
+                    "success": True,
+                    "message": "Attendance marked successfully",
+                    "attendance": AttendanceSerializer(attendances[0]).data
+                })
             
             return Response({
                 "success": True,
-                "message": "Attendance marked successfully",
-                "attendance": AttendanceSerializer(attendance).data
+                "message": f"Attendance marked for {len(user_ids)} users",
+                "attendances": AttendanceSerializer(attendances, many=True).data
             })
             
-        except User.DoesNotExist:
+        except (ValueError, ValidationError):
             return Response({"error": "User not found"}, status=404)
         except Exception as e:
             return Response({"error": str(e)}, status=400)
@@ -57,22 +75,18 @@ class AttendanceSessionViewSet(viewsets.ModelViewSet):
             return Response({"error": "Session already marked as finished"}, status=400)
         
         try:
-            # Mark session as finished and inactive
-            session.is_finished = True
-            session.is_active = False
-            session.end_time = timezone.now()
-            session.save()
-            
-            # Mark all target users who don't have an attendance record as absent
-            present_users = session.attendances.values_list('user_id', flat=True)
-            absent_users = session.target_users.exclude(id__in=present_users)
-            
-            for user in absent_users:
-                Attendance.objects.create(
-                    session=session,
-                    user=user,
-                    is_present=False
-                )
+            with transaction.atomic():
+                # Mark session as finished and inactive
+                session.is_finished = True
+                session.is_active = False
+                session.end_time = timezone.now()
+                session.save()
+                
+                # Mark all target users who don't have an attendance record as absent
+                mark_absent_users(session)
+            
+            from camera.session_worker import session_workers
+            session_workers.stop(session.id)
             
             return Response({
                 "success": True,
@@ -83,6 +97,41 @@ class AttendanceSessionViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({"error": str(e)}, status=400)
     
+    @action(detail=True, methods=['get', 'post', 'delete'])
+    def recognition_worker(self, request, pk=None):
+        """Start (POST), stop (DELETE) or inspect (GET) server-side recognition from the session's ESP32-CAM"""
+        from camera.session_worker import session_workers
+        
+        session = self.get_object()
+        
+        if request.method == 'POST':
+            if session.is_finished:
+                return Response({"error": "Session is already finished"}, status=400)
+            if session.camera_mode != 'ESP32' or not session.esp32_ip:
+                return Response({"error": "Session must use ESP32 camera mode with an esp32_ip"}, status=400)
+            
+            options = {}
+            try:
+                for name, cast in (('frame_rate', float), ('min_hits', int), ('window', int)):
+                    if request.data.get(name) is not None:
+                        options[name] = cast(request.data.get(name))
+            except (TypeError, ValueError):
+                return Response({"error": "frame_rate, min_hits and window must be numbers"}, status=400)
+            if any(value <= 0 for value in options.values()):
+                return Response({"error": "frame_rate, min_hits and window must be positive"}, status=400)
+            
+            worker = session_workers.start(session, **options)
+            return Response({"success": True, "worker": worker.status()})
+        
+        if request.method == 'DELETE':
+            worker = session_workers.stop(session.id, timeout=5)
+            if worker is None:
+                return Response({"error": "Recognition worker is not running"}, status=404)
+            return Response({"success": True, "worker": worker.status()})
+        
+        worker = session_workers.get(session.id)
+        return Response({"success": True, "worker": worker.status() if worker else None})
+    
     @action(detail=False, methods=['get'])
     def report(self, request):
         start_date = request.query_params.get('start_date')
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "attendance_system.settings")
 
 application = get_asgi_application()
+
+# TensorFlow and the recognition model load on first use unless FACE_MODEL_PRELOAD or FACE_MODEL_WARMUP is set
+from camera.model_handle import preload_face_model  # noqa: E402
+
+preload_face_model()
@@ -125,4 +125,101 @@ REST_FRAMEWORK = {
     #     'rest_framework.authentication.SessionAuthentication',
     #     'rest_framework.authentication.BasicAuthentication',
     # ],
-}
\ No newline at end of file
+}
+
+# Face recognition settings
+# 'classifier' uses the trained MobileNetV2 softmax head; 'embedding' matches
+# L2-normalised backbone embeddings against the enrolled gallery (no retraining)
+FACE_RECOGNITION_MODE = os.environ.get('FACE_RECOGNITION_MODE', 'classifier')
+
+# Largest number of face crops sent through the network in a single call
+FACE_INFERENCE_BATCH_SIZE = 32
+
+# Number of pre-loaded face detector instances shared between request threads
+FACE_DETECTOR_POOL_SIZE = 4
+
+# Face detector backend: 'haar' (cascade at full resolution unless
+# FACE_DETECTION_MAX_SIDE is set), 'haar_fast' (cascade on a downscaled copy),
+# 'dnn' (ResNet-10 SSD) or 'yunet' (cv2.FaceDetectorYN).
+# The DNN backends read their weights from FACE_DETECTOR_MODEL_DIR.
+FACE_DETECTOR_BACKEND = os.environ.get('FACE_DETECTOR_BACKEND', 'haar')
+FACE_DETECTOR_MODEL_DIR = os.path.join(BASE_DIR, 'camera', 'models', 'detectors')
+FACE_DETECTOR_CONFIDENCE = 0.5
+FACE_DETECTOR_FAST_SCALE = 0.5
+
+# Optionally run Haar detection on a copy whose longest side is at most this
+# many pixels (ESP32 frames are 1024x768) and retry at full resolution only
+# when nothing is found. Faster, but faces smaller than about 24px on the copy
+# (~51px in a 1024px frame at 480) are missed next to larger ones. 0 disables it.
+FACE_DETECTION_MAX_SIDE = int(os.environ.get('FACE_DETECTION_MAX_SIDE', '0'))
+
+# Background model training: run the worker thread inside web processes (set to
+# False when running `manage.py run_training_worker` separately), how long to
+# wait for more enrolments before training, how often to poll for jobs, and
+# after how long a RUNNING job is assumed to belong to a dead worker and requeued.
+FACE_TRAINING_WORKER_IN_PROCESS = True
+FACE_TRAINING_COALESCE_SECONDS = 10
+FACE_TRAINING_POLL_SECONDS = 30
+FACE_TRAINING_STALE_SECONDS = 2 * 60 * 60
+
+# Processes used to decode training images and extract faces in parallel (1 = in-process)
+FACE_PREPROCESS_WORKERS = min(4, os.cpu_count() or 1)
+
+# Seconds a worker may keep its cached set of enrolled users before re-reading it
+FACE_ENROLLED_USERS_TTL = 60
+
+# Seconds a worker may keep a session's cached target users before re-reading them
+FACE_SESSION_CANDIDATES_TTL = 60
+
+# ESP32 MJPEG stream consumer: frames buffered per camera (oldest dropped first),
+# seconds without data before reconnecting, reconnect backoff cap and the oldest
+# streamed frame (seconds) recognition will still use
+CAMERA_STREAM_QUEUE_SIZE = 2
+CAMERA_STREAM_READ_TIMEOUT = 10
+CAMERA_STREAM_MAX_BACKOFF = 30
+CAMERA_STREAM_MAX_FRAME_AGE = 2.0
+
+# Server-side recognition worker for ESP32 sessions: frames sampled per second,
+# confident hits needed within a sliding window of recognised frames before a
+# user is marked present, mean grayscale difference (0-255) below which a frame
+# is skipped as unchanged, most consecutive frames skipped, and seconds between
+# batched attendance writes
+FACE_SESSION_WORKER_FPS = 2
+FACE_SESSION_WORKER_MIN_HITS = 3
+FACE_SESSION_WORKER_WINDOW = 5
+FACE_SESSION_WORKER_DIFF_THRESHOLD = 4.0
+FACE_SESSION_WORKER_MAX_SKIPPED = 10
+FACE_SESSION_WORKER_FLUSH_SECONDS = 2
+
+# Pooled HTTP client for ESP32-CAMs: keep-alive connections per camera (the
+# firmware serves at most a few sockets), retries with exponential backoff and
+# (connect, read) timeouts per firmware endpoint
+CAMERA_HTTP_POOL_SIZE = 2
+CAMERA_HTTP_RETRIES = 2
+CAMERA_HTTP_BACKOFF = 0.3
+CAMERA_HTTP_TIMEOUTS = {
+    'capture': (3, 10),
+    'stopstream': (2, 3),
+    'stream': (5, 10),
+}
+
+# Threads running detection and inference for the async endpoints, and the most
+# calls accepted (running plus queued) before they answer 503
+FACE_INFERENCE_WORKERS = 2
+FACE_INFERENCE_MAX_PENDING = 8
+
+# Parallel camera health checks and multi-camera capture: (connect, read)
+# timeout per camera and the most cameras contacted at once
+CAMERA_PROBE_TIMEOUT = (2, 5)
+CAMERA_PROBE_MAX_WORKERS = 16
+
+# TensorFlow and the recognition model are imported on first recognition. Set
+# FACE_MODEL_PRELOAD=1 to load them while WSGI/ASGI workers start instead, so
+# the first request does not wait for them (management commands never preload)
+FACE_MODEL_PRELOAD = os.environ.get('FACE_MODEL_PRELOAD', '0') == '1'
+
+# Set FACE_MODEL_WARMUP=1 to load the model and run dummy batches of each size in
+# FACE_WARMUP_BATCH_SIZES through the detector and networks on a background
+# thread at worker start; /api/face-recognition/readiness/ answers 503 until done
+FACE_MODEL_WARMUP = os.environ.get('FACE_MODEL_WARMUP', '0') == '1'
+FACE_WARMUP_BATCH_SIZES = [1, FACE_INFERENCE_BATCH_SIZE]
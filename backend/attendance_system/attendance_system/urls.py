@@ -7,7 +7,8 @@ from rest_framework.routers import DefaultRouter
 
 from users.views import UserViewSet, UserTagViewSet
 from attendance.views import AttendanceSessionViewSet
-from camera.views import CameraConfigurationViewSet, FaceRecognitionViewSet
+from camera.views import CameraConfigurationViewSet, FaceRecognitionViewSet, TrainingJobViewSet
+from camera import async_views
 
 # Create a router and register viewsets
 router = DefaultRouter()
@@ -15,10 +16,14 @@ router.register(r'users', UserViewSet)
 router.register(r'user-tags', UserTagViewSet)  # Add UserTag endpoints
 router.register(r'attendance/sessions', AttendanceSessionViewSet)
 router.register(r'camera/configs', CameraConfigurationViewSet)
+router.register(r'camera/training-jobs', TrainingJobViewSet)
 router.register(r'face-recognition', FaceRecognitionViewSet, basename='face-recognition')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Async endpoints; these only avoid blocking a worker when served over ASGI
+    path('api/face-recognition/async/recognize_face/', async_views.recognize_face, name='face-recognition-async-recognize'),
+    path('api/camera/async/capture/', async_views.capture, name='camera-async-capture'),
     path('api/', include(router.urls)),
     path('api/auth/', include('rest_framework.urls')),
 ]
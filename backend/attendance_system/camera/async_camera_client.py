@@ -0,0 +1,69 @@
+# camera/async_camera_client.py
+import asyncio
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+from .camera_client import DEFAULT_TIMEOUTS, camera_clients
+
+
+class AsyncCameraClient:
+    """Non-blocking counterpart of CameraClient for async views
+
+    Uses the same pool size, retry count and per-endpoint timeouts, and adds
+    its requests to the shared per-camera counters in ``camera_clients``.
+    """
+
+    def __init__(self, ip_address, pool_size=None, retries=None, timeouts=None):
+        self.ip_address = ip_address
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or getattr(settings, 'CAMERA_HTTP_TIMEOUTS', {})))
+        self.retries = retries if retries is not None else getattr(settings, 'CAMERA_HTTP_RETRIES', 2)
+        self.backoff = getattr(settings, 'CAMERA_HTTP_BACKOFF', 0.3)
+        pool_size = pool_size or getattr(settings, 'CAMERA_HTTP_POOL_SIZE', 2)
+
+        self.client = httpx.AsyncClient(
+            base_url=f"http://{ip_address}",
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    def _timeout(self, endpoint):
+        connect, read = self.timeouts.get(endpoint, DEFAULT_TIMEOUTS['capture'])
+        return httpx.Timeout(read, connect=connect)
+
+    async def get(self, endpoint, params=None):
+        """GET ``/<endpoint>``, retrying refused connections and 5xx responses with backoff"""
+        stats = camera_clients.get(self.ip_address)
+        for attempt in range(self.retries + 1):
+            started = time.perf_counter()
+            try:
+                response = await self.client.get(f"/{endpoint}", params=params, timeout=self._timeout(endpoint))
+            except httpx.TransportError as e:
+                stats.record_request(started, str(e))
+                if attempt == self.retries:
+                    raise
+            else:
+                stats.record_request(started, None if response.is_success else f"HTTP {response.status_code}")
+                if response.status_code < 500 or attempt == self.retries:
+                    return response
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    async def capture(self):
+        return await self.get('capture', params={'t': int(time.time() * 1000)})
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# httpx clients are bound to the event loop that created them
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_camera_client(ip_address):
+    """The AsyncCameraClient for ``ip_address`` on the running event loop"""
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(ip_address)
+    if client is None:
+        client = clients[ip_address] = AsyncCameraClient(ip_address)
+    return client
@@ -0,0 +1,186 @@
+# camera/async_views.py
+import json
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, JsonResponse
+
+from .async_camera_client import get_async_camera_client
+from .decoding import decode_base64_image, decode_image
+from .enrolled_users import enrolled_users
+from .inference_executor import ExecutorBusy, inference_executor
+from .session_candidates import session_candidates
+from .timing import StageTimer
+
+
+def _recognize(image_bytes, candidates, timer):
+    """Decode a JPEG and recognise the candidate users in it (runs on the inference executor)"""
+    from .model_handle import face_recognition_model
+
+    with timer.stage('decode'):
+        image = decode_image(image_bytes)
+    if image is None:
+        return None
+
+    if not face_recognition_model.is_ready():
+        return []
+    return face_recognition_model.recognize_face(
+        image,
+        threshold=face_recognition_model.match_threshold,
+        timer=timer,
+        candidates=candidates
+    )
+
+
+def _session_candidates(session_id):
+    from attendance.models import AttendanceSession
+
+    session = AttendanceSession.objects.only('id', 'is_finished').get(id=session_id)
+    return session, session_candidates.get(session) & enrolled_users.get()
+
+
+def _mark_matches(session, best_results):
+    from attendance.marking import mark_users
+    from users.models import User
+
+    users = User.objects.filter(id__in=best_results.keys()).only('id', 'name')
+    users = {str(user.id): user for user in users}
+    mark_users(session, users.keys(), is_present=True)
+    return [
+        {
+            'user_id': str(user.id),
+            'name': user.name,
+            'uuid': str(user.id),
+            'confidence': best_results[user_id]['confidence'],
+            'location': best_results[user_id]['location'],
+            'attendance_marked': True
+        }
+        for user_id, user in users.items()
+    ]
+
+
+async def _fetch_frame(esp32_ip):
+    """Capture one JPEG from an ESP32-CAM without blocking the event loop; returns (bytes, error)"""
+    try:
+        response = await get_async_camera_client(esp32_ip).capture()
+    except httpx.HTTPError as e:
+        return None, f"Failed to capture from ESP32-CAM: {str(e)}"
+    if response.status_code != 200:
+        return None, f"Failed to capture from ESP32-CAM: HTTP {response.status_code}"
+    return response.content, None
+
+
+async def recognize_face(request):
+    """Async counterpart of FaceRecognitionViewSet.recognize_face
+
+    Camera capture is awaited on the event loop and detection/inference run on
+    the bounded inference executor, so slow cameras do not tie up workers.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    if request.content_type.startswith('image/'):
+        # Raw encoded image body; the other fields come from the query string
+        data = request.GET
+        image_body = request.body
+    else:
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({"success": False, "message": "Request body must be JSON"}, status=400)
+        image_body = None
+
+    session_id = data.get('session_id')
+    image_data = data.get('image_data')  # Base64 encoded image
+    camera_mode = data.get('camera_mode', 'WEBCAM')
+    esp32_ip = data.get('esp32_ip')
+    timer = StageTimer()
+
+    from attendance.models import AttendanceSession
+
+    try:
+        session, candidates = await sync_to_async(_session_candidates)(session_id)
+    except (AttendanceSession.DoesNotExist, ValidationError, ValueError):
+        return JsonResponse({"error": "Session not found"}, status=404)
+
+    if session.is_finished:
+        return JsonResponse({"error": "Session is already finished"}, status=400)
+
+    if camera_mode == 'WEBCAM' and image_body:
+        image_bytes = image_body
+    elif camera_mode == 'WEBCAM' and image_data:
+        try:
+            image_bytes = decode_base64_image(image_data)
+        except ValueError:
+            return JsonResponse({"success": False, "message": "Invalid image format or empty image"}, status=400)
+    elif camera_mode == 'ESP32' and esp32_ip:
+        with timer.stage('capture'):
+            image_bytes, error = await _fetch_frame(esp32_ip)
+        if image_bytes is None:
+            return JsonResponse({"success": False, "message": error}, status=400)
+    else:
+        return JsonResponse({
+            "success": False,
+            "message": "Invalid data: image_data required for WEBCAM mode, esp32_ip required for ESP32 mode"
+        }, status=400)
+
+    if not candidates:
+        return JsonResponse({
+            "success": False,
+            "message": "No users in this session have registered face images"
+        })
+
+    try:
+        results = await inference_executor.submit(_recognize, image_bytes, candidates, timer)
+    except ExecutorBusy:
+        return JsonResponse({"success": False, "message": "Recognition is busy, try again shortly"}, status=503)
+    except Exception as e:
+        print(f"Error in face recognition: {str(e)}")
+        results = []
+
+    if results is None:
+        return JsonResponse({"success": False, "message": "Invalid image format or empty image"}, status=400)
+
+    # Several faces can resolve to the same person; keep the most confident one
+    best_results = {}
+    for face_result in results:
+        user_id = face_result['label']
+        if user_id not in best_results or face_result['confidence'] > best_results[user_id]['confidence']:
+            best_results[user_id] = face_result
+
+    matches = []
+    if best_results:
+        with timer.stage('mark_attendance'):
+            matches = await sync_to_async(_mark_matches)(session, best_results)
+
+    if matches:
+        return JsonResponse({
+            "success": True,
+            "message": "Face(s) recognized successfully",
+            "matches": matches,
+            "timings": timer.as_dict()
+        })
+    return JsonResponse({
+        "success": False,
+        "message": "No matching faces found in the system",
+        "suggestion": "Please ensure you are registered in the system and try again with better lighting",
+        "timings": timer.as_dict()
+    })
+
+
+async def capture(request):
+    """Return a fresh JPEG from the ESP32-CAM at ``?ip=`` without blocking a worker thread"""
+    esp32_ip = request.GET.get('ip')
+    if not esp32_ip:
+        return JsonResponse({"error": "IP address is required"}, status=400)
+
+    image_bytes, error = await _fetch_frame(esp32_ip)
+    if image_bytes is None:
+        return JsonResponse({"success": False, "message": error}, status=502)
+    return HttpResponse(image_bytes, content_type='image/jpeg')
+
+
+# DRF exempts its views from CSRF; do the same for these plain async views
+recognize_face.csrf_exempt = True
+capture.csrf_exempt = True
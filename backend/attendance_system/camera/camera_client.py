@@ -0,0 +1,165 @@
+# camera/camera_client.py
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts in seconds per firmware endpoint
+DEFAULT_TIMEOUTS = {
+    'capture': (3, 10),
+    'stopstream': (2, 3),
+    'stream': (5, 10),
+}
+
+
+class CameraClient:
+    """HTTP client for one ESP32-CAM with a small keep-alive connection pool
+
+    The camera's httpd only has a handful of sockets, so requests reuse
+    pooled connections. Refused connections and 5xx responses are retried with
+    exponential backoff. Latency and error counts are kept per camera.
+
+    The pool does not block: a request beyond ``pool_size`` opens an extra
+    connection rather than waiting for one with no timeout. The long-lived
+    /stream response has its own session, so it never holds a pooled
+    connection.
+    """
+
+    def __init__(self, ip_address, pool_size=None, retries=None, backoff=None, timeouts=None):
+        self.ip_address = ip_address
+        self.base_url = f"http://{ip_address}"
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or getattr(settings, 'CAMERA_HTTP_TIMEOUTS', {})))
+
+        retry = Retry(
+            total=retries if retries is not None else getattr(settings, 'CAMERA_HTTP_RETRIES', 2),
+            backoff_factor=backoff if backoff is not None else getattr(settings, 'CAMERA_HTTP_BACKOFF', 0.3),
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=('GET',),
+            raise_on_status=False,
+        )
+        pool_size = pool_size or getattr(settings, 'CAMERA_HTTP_POOL_SIZE', 2)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+
+        # The stream consumer reconnects with its own backoff, so no retries here
+        self.stream_session = requests.Session()
+        self.stream_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+
+        # Single attempts for health checks, which must give up after one timeout
+        self.probe_session = requests.Session()
+        self.probe_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+
+        self.requests = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.last_latency = None
+        self.last_error = None
+        self.last_success_at = None
+        self._lock = threading.Lock()
+
+    def record_request(self, started, error=None):
+        """Count one request that started at ``started`` (a perf_counter value)"""
+        latency = time.perf_counter() - started
+        with self._lock:
+            self.requests += 1
+            self.total_latency += latency
+            self.last_latency = latency
+            if error is None:
+                self.last_success_at = time.time()
+            else:
+                self.errors += 1
+                self.last_error = error
+
+    def get(self, endpoint, params=None, stream=False, timeout=None, session=None):
+        """GET ``/<endpoint>`` using that endpoint's timeout; raises requests exceptions"""
+        started = time.perf_counter()
+        try:
+            response = (session or self.session).get(
+                f"{self.base_url}/{endpoint}",
+                params=params,
+                stream=stream,
+                timeout=timeout or self.timeouts.get(endpoint, DEFAULT_TIMEOUTS['capture'])
+            )
+        except requests.exceptions.RequestException as e:
+            self.record_request(started, str(e))
+            raise
+
+        self.record_request(started, None if response.ok else f"HTTP {response.status_code}")
+        return response
+
+    def capture(self, timeout=None, retry=True):
+        """Fetch a single JPEG from /capture; the timestamp defeats caches on the camera side
+
+        With ``retry=False`` the request is made once, so an unreachable camera
+        costs a single connect timeout.
+        """
+        return self.get(
+            'capture',
+            params={'t': int(time.time() * 1000)},
+            timeout=timeout,
+            session=None if retry else self.probe_session
+        )
+
+    def stop_stream(self, timeout=None):
+        return self.get('stopstream', timeout=timeout)
+
+    def open_stream(self, read_timeout=None):
+        connect_timeout = self.timeouts['stream'][0]
+        return self.get(
+            'stream',
+            stream=True,
+            timeout=(connect_timeout, read_timeout or self.timeouts['stream'][1]),
+            session=self.stream_session
+        )
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ip_address': self.ip_address,
+                'requests': self.requests,
+                'errors': self.errors,
+                'avg_latency_ms': round(1000 * self.total_latency / self.requests, 1) if self.requests else None,
+                'last_latency_ms': round(1000 * self.last_latency, 1) if self.last_latency is not None else None,
+                'last_error': self.last_error,
+                'last_success_at': self.last_success_at,
+            }
+
+    def close(self):
+        self.session.close()
+        self.stream_session.close()
+        self.probe_session.close()
+
+
+class CameraClientRegistry:
+    """One CameraClient per camera address, shared by every request in the process"""
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, ip_address):
+        client = self._clients.get(ip_address)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(ip_address)
+                if client is None:
+                    client = CameraClient(ip_address)
+                    self._clients[ip_address] = client
+        return client
+
+    def stats(self):
+        return [client.stats() for client in list(self._clients.values())]
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
+
+
+camera_clients = CameraClientRegistry()
@@ -0,0 +1,91 @@
+# camera/camera_probe.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+
+from .camera_client import camera_clients
+from .mjpeg_stream import camera_streams
+from .models import CameraConfiguration
+
+
+def capture_frames(ip_addresses, timeout=None, max_workers=None):
+    """Capture one JPEG from every address at once
+
+    Returns ``{ip_address: {'ok', 'image', 'latency_ms', 'error', 'source'}}``.
+    Captures run in parallel with a single attempt each, so the total wall
+    time is about one camera timeout. The ESP32 httpd serves one request at a
+    time, so /capture stalls while the backend consumes /stream; cameras with
+    a running stream consumer report its newest frame instead.
+    """
+    ip_addresses = list(dict.fromkeys(ip_addresses))
+    if not ip_addresses:
+        return {}
+
+    timeout = timeout or getattr(settings, 'CAMERA_PROBE_TIMEOUT', (2, 5))
+    max_workers = min(len(ip_addresses), max_workers or getattr(settings, 'CAMERA_PROBE_MAX_WORKERS', 16))
+    max_frame_age = getattr(settings, 'CAMERA_STREAM_MAX_FRAME_AGE', 2.0)
+
+    def capture(ip_address):
+        started = time.perf_counter()
+        stream = camera_streams.for_ip(ip_address)
+        if stream is not None:
+            source = 'stream'
+            image = stream.recent_frame(max_frame_age, timeout=max_frame_age)
+            error = None if image is not None else f"No frame from the stream within {max_frame_age}s"
+        else:
+            source = 'capture'
+            try:
+                response = camera_clients.get(ip_address).capture(timeout=timeout, retry=False)
+                error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+                image = response.content if error is None else None
+            except requests.exceptions.RequestException as e:
+                error, image = str(e), None
+        return {
+            'ok': error is None,
+            'image': image,
+            'latency_ms': round(1000 * (time.perf_counter() - started), 1),
+            'error': error,
+            'source': source,
+        }
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='camera-probe') as executor:
+        return dict(zip(ip_addresses, executor.map(capture, ip_addresses)))
+
+
+def probe_cameras(cameras=None, include_inactive=False, timeout=None):
+    """Check every camera concurrently and save the outcome in one bulk update
+
+    Reachable cameras get ``last_connected`` set and are marked active;
+    unreachable ones are marked inactive. Returns one status dict per camera.
+    """
+    if cameras is None:
+        cameras = CameraConfiguration.objects.all()
+        if not include_inactive:
+            cameras = cameras.filter(is_active=True)
+    cameras = list(cameras)
+
+    frames = capture_frames([camera.ip_address for camera in cameras], timeout=timeout)
+
+    now = timezone.now()
+    results = []
+    for camera in cameras:
+        frame = frames[camera.ip_address]
+        camera.is_active = frame['ok']
+        if frame['ok']:
+            camera.last_connected = now
+        results.append({
+            'id': str(camera.id),
+            'name': camera.name,
+            'ip_address': camera.ip_address,
+            'ok': frame['ok'],
+            'latency_ms': frame['latency_ms'],
+            'error': frame['error'],
+            'source': frame['source'],
+            'last_connected': camera.last_connected,
+        })
+
+    CameraConfiguration.objects.bulk_update(cameras, ['is_active', 'last_connected'])
+    return results
@@ -0,0 +1,71 @@
+# camera/dataset.py
+import os
+from collections import defaultdict
+
+from django.conf import settings
+
+from .models import FaceImage
+
+
+def iter_face_image_rows(chunk_size=2000):
+    """Stream ``(face_image_id, user_id, image_path)`` for every face image in one query"""
+    return FaceImage.objects.order_by().values_list('id', 'user_id', 'image_path').iterator(chunk_size=chunk_size)
+
+
+def existing_files(paths):
+    """Return the set of paths that exist, listing each directory once instead of stat-ing every file"""
+    by_directory = defaultdict(list)
+    for path in paths:
+        directory, filename = os.path.split(path)
+        by_directory[directory].append(filename)
+
+    existing = set()
+    for directory, filenames in by_directory.items():
+        try:
+            with os.scandir(directory) as entries:
+                present = {entry.name for entry in entries}
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        existing.update(os.path.join(directory, filename) for filename in filenames if filename in present)
+    return existing
+
+
+class TrainingDataset:
+    """Face images available for training, labelled with their user ids"""
+
+    def __init__(self):
+        self.face_image_ids = []
+        self.image_paths = []
+        self.labels = []
+        self.total_images = 0  # Including records whose file is missing
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    @property
+    def user_ids(self):
+        return set(self.labels)
+
+    def counts_by_user(self):
+        counts = defaultdict(int)
+        for label in self.labels:
+            counts[label] += 1
+        return dict(counts)
+
+
+def build_dataset(chunk_size=2000):
+    """Collect every face image whose file exists on disk, in one query"""
+    rows = [
+        (str(face_image_id), str(user_id), os.path.join(settings.MEDIA_ROOT, image_path))
+        for face_image_id, user_id, image_path in iter_face_image_rows(chunk_size)
+    ]
+    present = existing_files(path for _, _, path in rows)
+
+    dataset = TrainingDataset()
+    dataset.total_images = len(rows)
+    for face_image_id, user_id, image_path in rows:
+        if image_path in present:
+            dataset.face_image_ids.append(face_image_id)
+            dataset.image_paths.append(image_path)
+            dataset.labels.append(user_id)
+    return dataset
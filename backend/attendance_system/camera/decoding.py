@@ -0,0 +1,38 @@
+# camera/decoding.py
+import base64
+import binascii
+import os
+
+import cv2
+import numpy as np
+
+
+def decode_base64_image(image_data):
+    """Bytes of a base64 image, with or without a ``data:image/...;base64,`` prefix
+
+    Raises ValueError when the data is not valid base64.
+    """
+    image_data = image_data.split(',')[1] if ',' in image_data else image_data
+    try:
+        return base64.b64decode(image_data)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 image data: {str(e)}")
+
+
+def decode_image(buffer):
+    """Decode encoded image bytes (JPEG, PNG, ...) straight from memory into a BGR array
+
+    Accepts bytes, bytearray or memoryview; returns None for empty or
+    undecodable data.
+    """
+    if buffer is None or len(buffer) == 0:
+        return None
+    return cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def save_image_bytes(image_bytes, path):
+    """Persist the original encoded bytes, without re-encoding, and return the path"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(image_bytes)
+    return path
@@ -0,0 +1,243 @@
+# camera/embedding_store.py
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves from several processes are not serialised
+    fcntl = None
+
+
+class EmbeddingStore:
+    """Row-per-face embedding matrix persisted as a .npy file with a JSON sidecar index
+
+    Each row is keyed by a FaceImage id and labelled with the owning User id. The
+    matrix is memory-mapped on load, so workers share the pages instead of copying
+    them; the first write after a load copies it into a growable in-memory buffer.
+
+    Several worker processes share the files: ``refresh()`` reloads them when
+    another process has saved, and changes are made inside ``transaction()``,
+    which applies them to the newest copy on disk under a file lock.
+    """
+
+    def __init__(self, directory, name='face_embeddings', version=None):
+        self.matrix_path = os.path.join(directory, f'{name}.npy')
+        self.index_path = os.path.join(directory, f'{name}.json')
+        self.lock_path = os.path.join(directory, f'{name}.lock')
+        self.version = version
+        self.lock = threading.RLock()
+        self._disk_state = None
+        self._dirty = False
+        self.clear()
+
+    def clear(self):
+        """Drop all rows"""
+        with self.lock:
+            self._matrix = None
+            self._size = 0
+            self._writable = False
+            self.keys = []
+            self.labels = []
+            self._positions = {}
+            self._label_groups = None
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key):
+        return str(key) in self._positions
+
+    @property
+    def matrix(self):
+        """The (rows, dim) embedding matrix, without spare capacity"""
+        if self._matrix is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._matrix[:self._size]
+
+    def label_of(self, key):
+        position = self._positions.get(str(key))
+        return None if position is None else self.labels[position]
+
+    def label_groups(self):
+        """Return (identities, row_to_identity) for collapsing row scores per label"""
+        with self.lock:
+            if self._label_groups is None:
+                self._label_groups = np.unique(np.array(self.labels), return_inverse=True)
+            return self._label_groups
+
+    def _stat(self):
+        """Identity of the files on disk, which changes whenever any process saves"""
+        try:
+            return tuple(
+                (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                for stat in (os.stat(self.matrix_path), os.stat(self.index_path))
+            )
+        except OSError:
+            return None
+
+    def changed_on_disk(self):
+        """Whether the files differ from the ones this process last loaded or saved"""
+        return self._stat() != self._disk_state
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        if fcntl is None:
+            yield
+            return
+
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def load(self):
+        """Memory-map the stored matrix; returns False if nothing usable is on disk"""
+        with self.lock, self._file_lock(exclusive=False):
+            return self._load()
+
+    def refresh(self):
+        """Reload the store if another process saved it since this one last read or wrote it"""
+        if not self.changed_on_disk():
+            return False
+        return self.load()
+
+    @contextmanager
+    def transaction(self):
+        """Change the store against the newest copy on disk and save it on exit
+
+        Holds an exclusive lock shared by all processes and first reloads the
+        files if another process saved them, so rows it appended are kept
+        instead of being overwritten with this process's stale copy.
+        """
+        with self.lock, self._file_lock(exclusive=True):
+            if self.changed_on_disk():
+                self._load()
+            self._dirty = False
+            yield self
+            if self._dirty:
+                self._save()
+
+    def _load(self):
+        # Remember what was read even if it is unusable, so it is not re-read on every refresh
+        self._disk_state = self._stat()
+        if self._disk_state is None:
+            return False
+
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+
+            if index.get('version') != self.version:
+                print("Embedding store was built by a different model version, ignoring it")
+                return False
+
+            matrix = np.load(self.matrix_path, mmap_mode='r')
+            if len(matrix) != len(index['keys']):
+                print("Embedding store index does not match its matrix, ignoring it")
+                return False
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Could not load embedding store: {str(e)}")
+            return False
+
+        with self.lock:
+            self._matrix = matrix
+            self._size = len(matrix)
+            self._writable = False
+            self.keys = [str(key) for key in index['keys']]
+            self.labels = [str(label) for label in index['labels']]
+            self._positions = {key: i for i, key in enumerate(self.keys)}
+            self._label_groups = None
+            self._dirty = False
+        return True
+
+    def _save(self):
+        """Atomically write the matrix and index to disk; call inside ``transaction()``"""
+        with self.lock:
+            matrix = np.ascontiguousarray(self.matrix, dtype=np.float32)
+            index = {'version': self.version, 'keys': self.keys, 'labels': self.labels}
+
+            os.makedirs(os.path.dirname(self.matrix_path), exist_ok=True)
+            tmp_matrix_path = f'{self.matrix_path}.tmp'
+            tmp_index_path = f'{self.index_path}.tmp'
+
+            with open(tmp_matrix_path, 'wb') as f:
+                np.save(f, matrix)
+            with open(tmp_index_path, 'w') as f:
+                json.dump(index, f)
+
+            os.replace(tmp_matrix_path, self.matrix_path)
+            os.replace(tmp_index_path, self.index_path)
+            self._disk_state = self._stat()
+            self._dirty = False
+
+    def _reserve(self, rows, dim):
+        """Make room for ``rows`` more rows, growing geometrically"""
+        needed = self._size + rows
+        capacity = len(self._matrix) if self._matrix is not None else 0
+
+        if self._writable and needed <= capacity:
+            return
+
+        capacity = max(needed, 2 * capacity, 64)
+        grown = np.zeros((capacity, dim), dtype=np.float32)
+        if self._size:
+            grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+        self._writable = True
+
+    def add(self, keys, labels, embeddings):
+        """Append rows, replacing any existing rows with the same keys"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings[np.newaxis, :]
+        keys = [str(key) for key in keys]
+
+        with self.lock:
+            self.remove([key for key in keys if key in self._positions])
+            self._reserve(len(embeddings), embeddings.shape[1])
+
+            self._matrix[self._size:self._size + len(embeddings)] = embeddings
+            for key, label in zip(keys, labels):
+                self._positions[key] = self._size
+                self.keys.append(key)
+                self.labels.append(str(label))
+                self._size += 1
+            self._label_groups = None
+            self._dirty = True
+
+    def remove(self, keys):
+        """Remove rows by key; returns the number of rows removed"""
+        removed = 0
+
+        with self.lock:
+            for key in keys:
+                position = self._positions.pop(str(key), None)
+                if position is None:
+                    continue
+
+                if not self._writable:
+                    self._reserve(0, self._matrix.shape[1])
+
+                # Move the last row into the hole so removal stays O(1)
+                last = self._size - 1
+                if position != last:
+                    self._matrix[position] = self._matrix[last]
+                    self.keys[position] = self.keys[last]
+                    self.labels[position] = self.labels[last]
+                    self._positions[self.keys[position]] = position
+                self.keys.pop()
+                self.labels.pop()
+                self._size -= 1
+                removed += 1
+
+            if removed:
+                self._label_groups = None
+                self._dirty = True
+        return removed
@@ -0,0 +1,42 @@
+# camera/enrolled_users.py
+import threading
+import time
+
+from django.conf import settings
+
+
+class EnrolledUserCache:
+    """In-process set of ids of users that have at least one face image
+
+    FaceImage save/delete signals invalidate it in the process that made the
+    change; ``ttl`` bounds how stale it can get for changes made by other
+    worker processes.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'FACE_ENROLLED_USERS_TTL', 60)
+        self._user_ids = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        user_ids, loaded_at = self._user_ids, self._loaded_at
+        if user_ids is not None and time.monotonic() - loaded_at < self.ttl:
+            return user_ids
+
+        from .models import FaceImage
+
+        with self._lock:
+            if self._user_ids is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._user_ids = frozenset(
+                    str(user_id) for user_id in FaceImage.objects.values_list('user_id', flat=True).distinct()
+                )
+                self._loaded_at = time.monotonic()
+            return self._user_ids
+
+    def invalidate(self):
+        with self._lock:
+            self._user_ids = None
+
+
+enrolled_users = EnrolledUserCache()
@@ -0,0 +1,263 @@
+# camera/face_detector.py
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+HAAR_CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+# Weights for the DNN backends are not shipped; download them into FACE_DETECTOR_MODEL_DIR
+SSD_PROTOTXT = 'deploy.prototxt'
+SSD_WEIGHTS = 'res10_300x300_ssd_iter_140000.caffemodel'
+YUNET_WEIGHTS = 'face_detection_yunet_2023mar.onnx'
+
+
+def _model_file(filename):
+    model_dir = getattr(
+        settings, 'FACE_DETECTOR_MODEL_DIR',
+        os.path.join(settings.BASE_DIR, 'camera', 'models', 'detectors')
+    )
+    path = os.path.join(model_dir, filename)
+    if not os.path.exists(path):
+        raise RuntimeError(f"Face detector model file not found: {path}")
+    return path
+
+
+def _as_boxes(faces):
+    """Normalise detector output to an (N, 4) int array of (x, y, w, h)"""
+    if len(faces) == 0:
+        return np.zeros((0, 4), dtype=int)
+    return np.asarray(faces, dtype=int).reshape(-1, 4)
+
+
+def _clip_boxes(boxes, width, height):
+    """Clip (x, y, w, h) boxes to the image and drop empty ones"""
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    x1 = np.clip(boxes[:, 0], 0, width)
+    y1 = np.clip(boxes[:, 1], 0, height)
+    x2 = np.clip(boxes[:, 0] + boxes[:, 2], 0, width)
+    y2 = np.clip(boxes[:, 1] + boxes[:, 3], 0, height)
+    clipped = np.stack([x1, y1, x2 - x1, y2 - y1], axis=1).astype(int)
+    return clipped[(clipped[:, 2] > 0) & (clipped[:, 3] > 0)]
+
+
+class HaarBackend:
+    """Haar cascade on the equalised image, with a lenient second pass
+
+    With ``FACE_DETECTION_MAX_SIDE`` set, detection first runs on a copy whose
+    longest side is at most that many pixels and the boxes are mapped back to
+    full resolution, so crops are still taken from the original image. The
+    full-resolution image is only searched when the small pass finds nothing.
+    ``minSize`` is scaled with the copy, but the cascade cannot see faces
+    smaller than its 24px window there, so faces under about ``24 / scale``
+    full-resolution pixels are missed whenever a larger face is found.
+    """
+
+    name = 'haar'
+
+    def __init__(self):
+        self.cascade = cv2.CascadeClassifier(HAAR_CASCADE_PATH)
+        if self.cascade.empty():
+            raise RuntimeError(f"Could not load face cascade from {HAAR_CASCADE_PATH}")
+        self.max_side = getattr(settings, 'FACE_DETECTION_MAX_SIDE', 0)
+
+    def _prepare(self, image):
+        # Convert to grayscale and equalise the histogram to improve contrast
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return cv2.equalizeHist(gray)
+
+    def _detect_gray(self, gray, scale=1.0):
+        # Minimum face sizes are in full-resolution pixels
+        def min_size(pixels):
+            side = max(1, int(round(pixels * scale)))
+            return (side, side)
+
+        faces = self.cascade.detectMultiScale(
+            gray,
+            scaleFactor=1.05,
+            minNeighbors=3,
+            minSize=min_size(30),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+
+        # If no faces found with initial parameters, try with more lenient settings
+        if len(faces) == 0:
+            faces = self.cascade.detectMultiScale(
+                gray,
+                scaleFactor=1.03,
+                minNeighbors=2,
+                minSize=min_size(20),
+                flags=cv2.CASCADE_SCALE_IMAGE
+            )
+
+        return _as_boxes(faces)
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        scale = self.max_side / max(height, width) if self.max_side else 1.0
+
+        if scale < 1.0:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            faces = self._detect_gray(cv2.equalizeHist(small), scale)
+
+            if len(faces):
+                return _clip_boxes(np.round(faces / scale), width, height)
+
+            # Nothing at low resolution; small or distant faces may still be found at full size
+            return self._detect_gray(cv2.equalizeHist(gray))
+
+        return self._detect_gray(self._prepare(image))
+
+
+class FastHaarBackend(HaarBackend):
+    """Single coarse Haar pass on a downscaled copy of the image"""
+
+    name = 'haar_fast'
+
+    def __init__(self):
+        super().__init__()
+        self.scale = getattr(settings, 'FACE_DETECTOR_FAST_SCALE', 0.5)
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        gray = self._prepare(image)
+        small = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+        faces = self.cascade.detectMultiScale(
+            small,
+            scaleFactor=1.1,
+            minNeighbors=3,
+            minSize=(20, 20),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+
+        return _clip_boxes(np.round(_as_boxes(faces) / self.scale), width, height)
+
+
+class DnnSsdBackend:
+    """OpenCV DNN ResNet-10 SSD face detector on CPU"""
+
+    name = 'dnn'
+
+    def __init__(self):
+        self.net = cv2.dnn.readNetFromCaffe(_model_file(SSD_PROTOTXT), _model_file(SSD_WEIGHTS))
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.confidence = getattr(settings, 'FACE_DETECTOR_CONFIDENCE', 0.5)
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(image, 1.0, (300, 300), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+
+        detections = detections[detections[:, 2] >= self.confidence]
+        corners = detections[:, 3:7] * np.array([width, height, width, height])
+        boxes = np.column_stack([corners[:, :2], corners[:, 2:] - corners[:, :2]])
+        return _clip_boxes(boxes, width, height)
+
+
+class YuNetBackend:
+    """OpenCV YuNet face detector (cv2.FaceDetectorYN) on CPU"""
+
+    name = 'yunet'
+
+    def __init__(self):
+        self.detector = cv2.FaceDetectorYN.create(
+            _model_file(YUNET_WEIGHTS), '', (320, 320),
+            getattr(settings, 'FACE_DETECTOR_CONFIDENCE', 0.5)
+        )
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        self.detector.setInputSize((width, height))
+        _, faces = self.detector.detect(image)
+
+        if faces is None:
+            return _as_boxes([])
+        return _clip_boxes(faces[:, :4], width, height)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (HaarBackend, FastHaarBackend, DnnSsdBackend, YuNetBackend)
+}
+
+
+class FaceDetector:
+    """Process-wide face detector with a selectable backend
+
+    Detector instances (cascades, DNN nets) must not be shared between threads
+    while detecting, so a pool of pre-loaded instances is created up front and
+    each call borrows one. Models are loaded at startup instead of per request;
+    if more threads detect at once than the pool holds, it grows by one instance.
+    """
+
+    def __init__(self, backend=None, pool_size=None):
+        self.backend = backend or getattr(settings, 'FACE_DETECTOR_BACKEND', 'haar')
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown face detector backend '{self.backend}'. Choose from: {', '.join(BACKENDS)}")
+
+        self.pool_size = pool_size or getattr(settings, 'FACE_DETECTOR_POOL_SIZE', 4)
+        self._pool = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+        for _ in range(self.pool_size):
+            self._pool.put(self._load())
+
+    def _load(self):
+        instance = BACKENDS[self.backend]()
+
+        with self._lock:
+            self._created += 1
+        return instance
+
+    @contextmanager
+    def _borrow(self):
+        try:
+            instance = self._pool.get_nowait()
+        except queue.Empty:
+            print("Face detector pool exhausted, loading another detector")
+            instance = self._load()
+        try:
+            yield instance
+        finally:
+            self._pool.put(instance)
+
+    @property
+    def signature(self):
+        """Backend and downscale setting, which decide which faces are found and where they are cropped"""
+        return f"{self.backend}-{getattr(settings, 'FACE_DETECTION_MAX_SIDE', 0)}"
+
+    def warm_up(self, image):
+        """Run ``image`` through every idle pooled instance, so DNN backends allocate before the first request"""
+        instances = []
+        while True:
+            try:
+                instances.append(self._pool.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            for instance in instances:
+                instance.detect(image)
+        finally:
+            for instance in instances:
+                self._pool.put(instance)
+        return len(instances)
+
+    def detect(self, image):
+        """Detect faces in a BGR image, returning an (N, 4) array of (x, y, w, h) boxes"""
+        if image is None:
+            return _as_boxes([])
+
+        with self._borrow() as instance:
+            return instance.detect(image)
+
+
+face_detector = FaceDetector()
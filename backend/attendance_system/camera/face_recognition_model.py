@@ -8,20 +8,62 @@ from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropou
 from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
 from tensorflow.keras.preprocessing.image import img_to_array
-from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping
+from tensorflow.keras.callbacks import EarlyStopping
 from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
 from django.conf import settings
+from .embedding_store import EmbeddingStore
+from .feature_cache import default_feature_cache
+from .matching import rank_predictions, search_gallery
+from .model_handle import CLASSIFIER_MODE, EMBEDDING_MODE, EMBEDDING_VERSION
+from .face_detector import face_detector
+from .preprocessing import load_face_crops
+from .timing import StageTimer
 import pickle
+import threading
 import time
+from django.utils import timezone
+from datetime import datetime, timezone as dt_timezone
+
+# Width of the pooled MobileNetV2 features fed to the classifier head
+FEATURE_DIM = 1280
 
 class FaceRecognitionModel:
     def __init__(self):
-        self.face_detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.face_detector = face_detector
         self.model_path = os.path.join(settings.BASE_DIR, 'camera', 'models', 'face_recognition_model.h5')
         self.encoder_path = os.path.join(settings.BASE_DIR, 'camera', 'models', 'label_encoder.pickle')
         self.model_directory = os.path.join(settings.BASE_DIR, 'camera', 'models')
-        self.face_embeddings = {}  # Cache for face embeddings
+        
+        # Recognition mode and match thresholds (similarity for embeddings, probability for softmax)
+        self.mode = getattr(settings, 'FACE_RECOGNITION_MODE', CLASSIFIER_MODE)
+        default_threshold = 0.6 if self.mode == EMBEDDING_MODE else 0.7
+        self.match_threshold = getattr(settings, 'FACE_MATCH_THRESHOLD', default_threshold)
+        self.duplicate_threshold = getattr(settings, 'FACE_DUPLICATE_THRESHOLD', max(0.8, self.match_threshold))
+        
+        # Largest number of face crops sent through the network in one call
+        self.inference_batch_size = getattr(settings, 'FACE_INFERENCE_BATCH_SIZE', 32)
+        self._inference_fns = {}
+        self._classifier_head_cache = None
+        
+        # Set by warm_up once the detector and networks have run a dummy batch
+        self.warmed_up_at = None
+        self.warmup_timings = {}
+        self._warmup_lock = threading.Lock()
+        
+        # Embedding gallery: one row per FaceImage, persisted next to the model
+        self.embedding_model = None
+        self.embedding_store = EmbeddingStore(self.model_directory, version=EMBEDDING_VERSION)
+        
+        # Pooled backbone features per image, so retraining only runs the dense head
+        self.feature_cache = default_feature_cache()
+        self._gallery_loaded = False
+        self._gallery_lock = threading.RLock()
+        self._model_lock = threading.Lock()
+        
+        # Identity of the model/encoder files this process serves, to notice retrains done elsewhere
+        self._model_files_state = None
+        self._reload_lock = threading.Lock()
         
         # Create models directory if it doesn't exist
         os.makedirs(self.model_directory, exist_ok=True)
@@ -30,9 +72,58 @@ class FaceRecognitionModel:
         self.model = None
         self.label_encoder = None
         self._load_model_if_exists()
+        
+        # Map the persisted embeddings now; reconciling with the database waits for first use
+        if self.mode == EMBEDDING_MODE:
+            self.embedding_store.load()
+    
+    def _model_files(self):
+        """(inode, mtime, size) of the model and encoder files, or None while either is missing"""
+        try:
+            return tuple(
+                (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                for stat in (os.stat(self.model_path), os.stat(self.encoder_path))
+            )
+        except OSError:
+            return None
+    
+    def _reload_model_if_changed(self):
+        """Pick up a model retrained by another process (training worker, other web worker)
+        
+        The files are loaded outside ``_model_lock`` and swapped in as a pair,
+        so requests keep using the current model while the new one loads.
+        """
+        if self._model_files() == self._model_files_state:
+            return False
+        
+        with self._reload_lock:
+            files = self._model_files()
+            if files is None or files == self._model_files_state:
+                return False
+            
+            print("Face recognition model changed on disk, reloading...")
+            try:
+                model = load_model(self.model_path)
+                with open(self.encoder_path, 'rb') as f:
+                    label_encoder = pickle.load(f)
+            except Exception as e:
+                print(f"Warning: Could not reload face recognition model: {str(e)}")
+                return False
+            
+            # The trainer replaces the two files one after the other; wait for a matching pair
+            if len(label_encoder.classes_) != model.output_shape[-1] or self._model_files() != files:
+                return False
+            
+            with self._model_lock:
+                self.model = model
+                self.label_encoder = label_encoder
+                self._model_files_state = files
+            print("Model reloaded successfully")
+            return True
     
     def _load_model_if_exists(self):
         """Load the model and encoder if they exist on disk"""
+        self._model_files_state = self._model_files()
         if os.path.exists(self.model_path):
             print("Loading existing face recognition model...")
             self.model = load_model(self.model_path)
@@ -78,36 +169,313 @@ class FaceRecognitionModel:
         
         return model
     
-    def detect_faces(self, image):
-        if image is None:
-            return []
-            
-        # Convert to grayscale for face detection
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Apply histogram equalization to improve contrast
-        gray = cv2.equalizeHist(gray)
-        
-        # Try with different parameters to improve detection reliability
-        faces = self.face_detector.detectMultiScale(
-            gray,
-            scaleFactor=1.05,  # More fine-grained scaling (was 1.1)
-            minNeighbors=3,    # Reduce strictness (was 5)
-            minSize=(30, 30),
-            flags=cv2.CASCADE_SCALE_IMAGE
+    def _build_head(self, num_classes):
+        """Build the trainable dense head of the classifier on its own, fed pooled backbone features"""
+        head = Sequential([
+            Input(shape=(FEATURE_DIM,)),
+            Dense(512, activation='relu'),
+            Dropout(0.5),
+            Dense(256, activation='relu'),
+            Dropout(0.3),
+            Dense(num_classes, activation='softmax')
+        ])
+        
+        head.compile(
+            optimizer='adam',
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
         )
         
-        # If no faces found with initial parameters, try with more lenient settings
+        return head
+    
+    def _build_embedding_model(self):
+        """Build the frozen MobileNetV2 backbone used to produce face embeddings"""
+        base_model = MobileNetV2(
+            weights='imagenet',
+            include_top=False,
+            input_shape=(224, 224, 3),
+            pooling='avg'
+        )
+        base_model.trainable = False
+        return base_model
+    
+    def is_ready(self):
+        """Whether the model can currently recognize faces"""
+        if self.mode == EMBEDDING_MODE:
+            self._ensure_gallery()
+            return len(self.embedding_store) > 0
+        self._reload_model_if_changed()
+        return self.model is not None and self.label_encoder is not None
+    
+    def warm_up(self, batch_sizes=None):
+        """Run dummy batches through the detector and networks before real requests arrive
+        
+        The first call of each traced network builds its graph and the first
+        backbone use loads the ImageNet weights; both take seconds. Batches of
+        every size in ``batch_sizes`` (default FACE_WARMUP_BATCH_SIZES) go
+        through the backbone and, when trained, the classifier and its dense
+        head. Returns the milliseconds spent per stage.
+        """
+        batch_sizes = batch_sizes or getattr(settings, 'FACE_WARMUP_BATCH_SIZES', [1, self.inference_batch_size])
+        batch_sizes = sorted({min(max(1, int(size)), self.inference_batch_size) for size in batch_sizes})
+        timer = StageTimer()
+        
+        with self._warmup_lock:
+            with timer.stage('detector'):
+                self.face_detector.warm_up(np.zeros((480, 640, 3), dtype=np.uint8))
+            
+            with self._model_lock:
+                model = self.model if self.mode != EMBEDDING_MODE else None
+            
+            for batch_size in batch_sizes:
+                faces = np.zeros((batch_size, 224, 224, 3), dtype=np.float32)
+                with timer.stage(f'backbone_{batch_size}'):
+                    features = self._backbone_features(faces)
+                if model is not None:
+                    with timer.stage(f'classifier_{batch_size}'):
+                        self._predict('classifier', model, faces)
+                        self._predict('classifier_head', self._classifier_head(model), features)
+            
+            if self.mode == EMBEDDING_MODE:
+                with timer.stage('gallery'):
+                    self._ensure_gallery()
+            
+            self.warmup_timings = timer.as_dict()
+            self.warmed_up_at = timezone.now()
+        
+        print(f"Face recognition model warmed up in {self.warmup_timings['total']:.0f} ms (batch sizes {batch_sizes})")
+        return self.warmup_timings
+    
+    def warmup_status(self):
+        """Load and warm-up state plus the identity of the served model, for readiness checks"""
+        with self._model_lock:
+            model, label_encoder = self.model, self.label_encoder
+        
+        status = {
+            'loaded': True,
+            'warmed': self.warmed_up_at is not None,
+            'warmed_up_at': self.warmed_up_at.isoformat() if self.warmed_up_at else None,
+            'warmup_timings': self.warmup_timings,
+            'mode': self.mode,
+            'version': EMBEDDING_VERSION,
+            'model_path': self.model_path,
+            'model_modified_at': None,
+            'num_classes': len(label_encoder.classes_) if label_encoder is not None else 0,
+            'trained': model is not None and label_encoder is not None,
+        }
+        if os.path.exists(self.model_path):
+            status['model_modified_at'] = datetime.fromtimestamp(os.path.getmtime(self.model_path), tz=dt_timezone.utc).isoformat()
+        if self.mode == EMBEDDING_MODE:
+            # Reading the gallery size must not trigger the database reconciliation
+            status['gallery_size'] = len(self.embedding_store) if self._gallery_loaded else None
+            status['trained'] = bool(status['gallery_size'])
+        return status
+    
+    def _predict(self, name, model, faces):
+        """Run preprocessed faces through a model in batches of at most ``inference_batch_size``
+        
+        Uses a traced ``model(x, training=False)`` call instead of ``model.predict``,
+        which avoids Keras' per-call data adapter and callback setup.
+        """
+        cached = self._inference_fns.get(name)
+        if cached is None or cached[0] is not model:
+            signature = [tf.TensorSpec(shape=(None,) + tuple(model.input_shape[1:]), dtype=tf.float32)]
+            cached = (model, tf.function(lambda x: model(x, training=False), input_signature=signature))
+            self._inference_fns[name] = cached
+        inference_fn = cached[1]
+        
+        faces = np.asarray(faces, dtype=np.float32)
+        outputs = [
+            inference_fn(tf.convert_to_tensor(faces[start:start + self.inference_batch_size])).numpy()
+            for start in range(0, len(faces), self.inference_batch_size)
+        ]
+        return np.concatenate(outputs).astype(np.float32)
+    
+    def _backbone_features(self, faces):
+        """Pooled MobileNetV2 features for a batch of preprocessed faces"""
+        if self.embedding_model is None:
+            self.embedding_model = self._build_embedding_model()
+        
+        faces = np.asarray(faces, dtype=np.float32)
         if len(faces) == 0:
-            faces = self.face_detector.detectMultiScale(
-                gray,
-                scaleFactor=1.03,  # Even more fine-grained scaling
-                minNeighbors=2,    # Even less strict
-                minSize=(20, 20),  # Smaller minimum face size
-                flags=cv2.CASCADE_SCALE_IMAGE
+            return np.zeros((0, FEATURE_DIM), dtype=np.float32)
+        
+        return self._predict('embedding', self.embedding_model, faces)
+    
+    def _normalise(self, features):
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        return features / np.maximum(norms, 1e-12)
+    
+    def compute_embeddings(self, faces):
+        """Compute L2-normalised embeddings for a batch of preprocessed faces"""
+        return self._normalise(self._backbone_features(faces))
+    
+    def _image_features(self, image_paths, labels, progress=None, workers=None):
+        """Pooled backbone features for whole images, served from the feature cache where possible
+        
+        Returns the labels of the images that yielded a face and their features.
+        """
+        features = [None] * len(image_paths)
+        misses = []
+        
+        for i, image_path in enumerate(image_paths):
+            try:
+                key = self.feature_cache.file_hash(image_path)
+            except OSError as e:
+                print(f"Warning: Could not read image {image_path}: {str(e)}")
+                continue
+            
+            cached = self.feature_cache.get(key)
+            if cached is None:
+                misses.append((i, key, image_path))
+            elif cached.size:
+                features[i] = cached
+        
+        if misses:
+            print(f"Computing backbone features for {len(misses)} uncached images...")
+            faces, found = self._load_faces(
+                [image_path for _, _, image_path in misses],
+                [(i, key) for i, key, _ in misses],
+                progress=progress,
+                workers=workers
             )
+            for (i, key), feature in zip(found, self._backbone_features(faces)):
+                self.feature_cache.put(key, feature)
+                features[i] = feature
+            
+            # Remember images without a usable face so they are not re-detected next time
+            found_keys = set(key for _, key in found)
+            for _, key, _ in misses:
+                if key not in found_keys:
+                    self.feature_cache.put(key, None)
+        
+        valid = [i for i, feature in enumerate(features) if feature is not None]
+        if not valid:
+            return [], np.zeros((0, FEATURE_DIM), dtype=np.float32)
+        return [labels[i] for i in valid], np.stack([features[i] for i in valid]).astype(np.float32)
+    
+    def enroll_embeddings(self, keys, labels, embeddings):
+        """Add embeddings keyed by FaceImage id to the gallery and persist it"""
+        with self._gallery_lock, self.embedding_store.transaction() as store:
+            store.add(keys, labels, embeddings)
+    
+    def remove_face_images(self, face_image_ids):
+        """Drop deleted face images from the gallery without recomputing anything"""
+        with self._gallery_lock, self.embedding_store.transaction() as store:
+            return store.remove(face_image_ids)
+    
+    def _face_image_keys(self, image_paths):
+        """Map absolute image paths to FaceImage ids, falling back to the path itself"""
+        from camera.models import FaceImage
         
-        return faces
+        ids_by_path = {
+            os.path.normpath(os.path.join(settings.MEDIA_ROOT, image_path)): str(face_image_id)
+            for face_image_id, image_path in FaceImage.objects.values_list('id', 'image_path')
+        }
+        return [ids_by_path.get(os.path.normpath(path), path) for path in image_paths]
+    
+    def _embed_images(self, keys, image_paths, labels, progress=None, workers=None):
+        """Embed images; returns the keys, labels and embeddings that succeeded"""
+        valid, features = self._image_features(image_paths, list(zip(keys, labels)), progress=progress, workers=workers)
+        if not valid:
+            return [], [], None
+        valid_keys, valid_labels = zip(*valid)
+        return list(valid_keys), list(valid_labels), self._normalise(features)
+    
+    def _sync_gallery(self, keys, image_paths, labels, progress=None, workers=None):
+        """Make the gallery hold exactly ``keys``, embedding only rows it does not already have
+        
+        The gallery lock is only held to snapshot the store and to apply the
+        changes, so recognitions keep searching the current gallery while the
+        missing images are embedded.
+        """
+        store = self.embedding_store
+        wanted = set(keys)
+        
+        with self._gallery_lock:
+            store.refresh()
+            # Only rows present now count as stale, so faces other workers enrol meanwhile survive
+            stale = [key for key in list(store.keys) if key not in wanted]
+            missing = [
+                (key, path, str(label)) for key, path, label in zip(keys, image_paths, labels)
+                if store.label_of(key) != str(label)
+            ]
+        
+        new_keys = []
+        if missing:
+            new_keys, new_labels, embeddings = self._embed_images(*map(list, zip(*missing)), progress=progress, workers=workers)
+        
+        if not stale and not new_keys:
+            return False
+        
+        with self._gallery_lock, store.transaction():
+            store.remove(stale)
+            if new_keys:
+                store.add(new_keys, new_labels, embeddings)
+        return True
+    
+    def _ensure_gallery(self):
+        """Load the persisted gallery on first use and reconcile it with the database
+        
+        Afterwards the gallery is reloaded whenever another worker process has
+        saved it, so faces enrolled or deleted there are seen here too.
+        """
+        if self._gallery_loaded:
+            if self.embedding_store.changed_on_disk():
+                with self._gallery_lock:
+                    self.embedding_store.refresh()
+            return
+        
+        with self._gallery_lock:
+            if self._gallery_loaded:
+                return
+            
+            from camera.dataset import existing_files, iter_face_image_rows
+            
+            self.embedding_store.refresh()
+            
+            rows = [
+                (str(face_image_id), str(user_id), os.path.join(settings.MEDIA_ROOT, image_path))
+                for face_image_id, user_id, image_path in iter_face_image_rows()
+            ]
+            present = existing_files(img_path for _, _, img_path in rows)
+            
+            # Rows that already have an embedding stay even if their image file is gone
+            keys = []
+            image_paths = []
+            labels = []
+            for face_image_id, user_id, img_path in rows:
+                if face_image_id in self.embedding_store or img_path in present:
+                    keys.append(face_image_id)
+                    image_paths.append(img_path)
+                    labels.append(user_id)
+            
+            self._sync_gallery(keys, image_paths, labels)
+            self._gallery_loaded = True
+            print(f"Embedding gallery loaded with {len(self.embedding_store)} faces")
+    
+    def search_embeddings(self, embeddings, top_k=1, threshold=None, candidates=None):
+        """Find the top-k most similar enrolled identities for each query embedding
+        
+        Returns one list of (label, similarity) pairs per query, best first. Each
+        identity appears at most once per list and pairs below ``threshold`` are dropped.
+        ``candidates`` limits the search to a set of labels.
+        """
+        with self._gallery_lock:
+            # Searched under the lock: the matrix is a view that a writer may change
+            identities, inverse = self.embedding_store.label_groups()
+            return search_gallery(
+                embeddings, self.embedding_store.matrix, identities, inverse, top_k, threshold, candidates
+            )
+    
+    def detect_faces(self, image):
+        """Detect faces with the shared, pre-loaded detector"""
+        return self.face_detector.detect(image)
+    
+    def _preprocess(self, face):
+        """Convert a resized face crop to model input"""
+        face = img_to_array(face)
+        return preprocess_input(face)
     
     def extract_face(self, image, face_location, required_size=(224, 224)):
         """Extract face from image based on detection and preprocess for model"""
@@ -118,213 +486,387 @@ class FaceRecognitionModel:
         face = cv2.resize(face, required_size)
         
         # Preprocess for model input
-        face = img_to_array(face)
-        face = preprocess_input(face)
+        return self._preprocess(face)
+    
+    def _load_faces(self, image_paths, labels, progress=None, workers=None):
+        """Load images, detect and extract the first face of each one
+        
+        Decoding and detection run in a process pool; results keep the input order.
+        """
+        faces = []
+        valid_labels = []
+        
+        for (crop, message), label in zip(load_face_crops(image_paths, workers=workers, progress=progress), labels):
+            if crop is None:
+                print(message)
+                continue
+            faces.append(self._preprocess(crop))
+            valid_labels.append(label)
         
-        return face
+        return faces, valid_labels
     
-    def train_model(self, image_paths, labels):
-        """Train face recognition model with user images"""
+    def _gallery_accuracy(self, chunk_size=1024):
+        """Leave-one-out nearest neighbour accuracy of the gallery, computed in chunks"""
+        with self._gallery_lock:
+            matrix = np.array(self.embedding_store.matrix)
+            labels = np.array(self.embedding_store.labels)
+        
+        if len(matrix) < 2:
+            return 0.0
+        
+        correct = 0
+        for start in range(0, len(matrix), chunk_size):
+            similarities = matrix[start:start + chunk_size] @ matrix.T
+            rows = np.arange(len(similarities))
+            similarities[rows, rows + start] = -np.inf
+            nearest = np.argmax(similarities, axis=1)
+            correct += int(np.sum(labels[nearest] == labels[start:start + chunk_size]))
+        return correct / len(matrix)
+    
+    def _build_gallery(self, image_paths, labels, progress=None, workers=None):
+        """Bring the gallery in line with the given images, embedding only new ones"""
+        keys = self._face_image_keys(image_paths)
+        
+        # Recognition keeps using the current gallery until the sync swaps the new rows in
+        self._gallery_loaded = True
+        self._sync_gallery(keys, image_paths, labels, progress=progress, workers=workers)
+        
+        if len(self.embedding_store) == 0:
+            raise ValueError("No valid faces found in the provided images")
+        
+        accuracy = self._gallery_accuracy()
+        
+        return {
+            'accuracy': accuracy,
+            'val_accuracy': accuracy,
+            'model_path': self.embedding_store.matrix_path,
+            'num_classes': len(set(self.embedding_store.labels)),
+            'num_samples': len(self.embedding_store)
+        }
+    
+    def train_model(self, image_paths, labels, progress=None, workers=None):
+        """Train face recognition model with user images
+        
+        ``progress(done, total)`` is called while uncached images are preprocessed,
+        by ``workers`` processes (default FACE_PREPROCESS_WORKERS).
+        """
         if not image_paths or len(image_paths) < 2:
             raise ValueError("Not enough images for training. Need at least 2 images.")
         
-        if self.label_encoder is None:
-            self.label_encoder = LabelEncoder()
-        
-        encoded_labels = self.label_encoder.fit_transform(labels)
+        if self.mode == EMBEDDING_MODE:
+            return self._build_gallery(image_paths, labels, progress=progress, workers=workers)
         
-        faces = []
-        valid_labels = []
+        # Train a separate model and encoder; the live pair keeps serving until the swap below
+        label_encoder = LabelEncoder()
+        label_encoder.fit(labels)
+        num_classes = len(label_encoder.classes_)
         
-        for i, (image_path, label) in enumerate(zip(image_paths, labels)):
-            try:
-                image = cv2.imread(image_path)
-                if image is None:
-                    print(f"Warning: Could not load image {image_path}")
-                    continue
-                
-                detected_faces = self.detect_faces(image)
-                
-                if len(detected_faces) == 0:
-                    print(f"Warning: No face detected in {image_path}")
-                    continue
-                    
-                face = self.extract_face(image, detected_faces[0])
-                faces.append(face)
-                valid_labels.append(label)
-            except Exception as e:
-                print(f"Error processing image {image_path}: {str(e)}")
+        # Only the dense head is trained, on cached pooled features of the frozen backbone
+        valid_labels, features = self._image_features(image_paths, labels, progress=progress, workers=workers)
         
-        if not faces:
+        if not valid_labels:
             raise ValueError("No valid faces found in the provided images")
         
-        faces = np.array(faces)
-        valid_labels = np.array(valid_labels)
-        encoded_valid_labels = self.label_encoder.transform(valid_labels)
+        encoded_valid_labels = label_encoder.transform(np.array(valid_labels))
         
-        one_hot_labels = tf.keras.utils.to_categorical(encoded_valid_labels)
+        one_hot_labels = tf.keras.utils.to_categorical(encoded_valid_labels, num_classes=num_classes)
         
         X_train, X_test, y_train, y_test = train_test_split(
-            faces, one_hot_labels, 
+            features, one_hot_labels, 
             test_size=0.2, stratify=one_hot_labels, random_state=42
         )
         
-        if self.model is None:
+        head = self._build_head(num_classes)
+        current_model = self.model
+        if current_model is None:
             print("Building new model...")
-            self.model = self._build_model(len(self.label_encoder.classes_))
-        elif len(self.label_encoder.classes_) != self.model.layers[-1].output_shape[-1]:
+        elif num_classes != current_model.layers[-1].output_shape[-1]:
             print("Rebuilding model due to change in number of classes...")
-            self.model = self._build_model(len(self.label_encoder.classes_))
-        
-        checkpoint = ModelCheckpoint(
-            self.model_path, 
-            monitor='val_accuracy', 
-            verbose=1, 
-            save_best_only=True, 
-            mode='max'
-        )
+        else:
+            # Continue from the current head weights without touching the live model
+            for source, target in zip(current_model.layers[2:], head.layers):
+                target.set_weights(source.get_weights())
+        
         early_stopping = EarlyStopping(
             monitor='val_loss',
             patience=5,
             restore_best_weights=True
         )
         
-        history = self.model.fit(
+        history = head.fit(
             X_train, y_train,
             validation_data=(X_test, y_test),
             epochs=20,
             batch_size=32,
-            callbacks=[checkpoint, early_stopping]
+            callbacks=[early_stopping]
         )
         
-        with open(self.encoder_path, 'wb') as f:
-            pickle.dump(self.label_encoder, f)
+        # Put the trained head on top of the frozen backbone for image-level inference
+        model = self._build_model(num_classes)
+        for source, target in zip(head.layers, model.layers[2:]):
+            target.set_weights(source.get_weights())
+        
+        # Write to temporary files so other processes never load a half-written model
+        tmp_model_path = f"{self.model_path}.tmp.h5"
+        model.save(tmp_model_path)
         
-        self.face_embeddings = {}
+        tmp_encoder_path = f"{self.encoder_path}.tmp"
+        with open(tmp_encoder_path, 'wb') as f:
+            pickle.dump(label_encoder, f)
+        
+        # Swap the live model and encoder together, then publish the files
+        with self._model_lock:
+            self.model = model
+            self.label_encoder = label_encoder
+            os.replace(tmp_model_path, self.model_path)
+            os.replace(tmp_encoder_path, self.encoder_path)
+            self._model_files_state = self._model_files()
         
         return {
             'accuracy': float(history.history['accuracy'][-1]),
             'val_accuracy': float(history.history['val_accuracy'][-1]),
             'model_path': self.model_path,
-            'num_classes': len(self.label_encoder.classes_),
-            'num_samples': len(faces)
+            'num_classes': num_classes,
+            'num_samples': len(valid_labels)
         }
     
-    def recognize_face(self, image):
-        """Recognize a face in the given image"""
-        if self.model is None or self.label_encoder is None:
-            raise ValueError("Model not trained yet. Please train the model first.")
-        
-        faces = self.detect_faces(image)
+    def _classify_faces(self, faces, top_k=1, candidates=None):
+        """Score preprocessed faces and return the top-k (label, confidence) pairs for each
         
+        With ``candidates`` only those labels are considered; classifier
+        probabilities are not renormalised over them, so thresholds keep their meaning.
+        """
         if len(faces) == 0:
             return []
         
-        from camera.models import FaceImage
-        from users.models import User
+        if self.mode == EMBEDDING_MODE:
+            return self.search_embeddings(self.compute_embeddings(faces), top_k=top_k, candidates=candidates)
         
-        valid_user_ids = set()
-        for user in User.objects.all():
-            if FaceImage.objects.filter(user=user).exists():
-                valid_user_ids.add(str(user.id))
+        # Read the model and its encoder as a pair in case a retrain swaps them
+        with self._model_lock:
+            model, label_encoder = self.model, self.label_encoder
         
+        if candidates is not None and not np.isin(label_encoder.classes_.astype(str), list(candidates)).any():
+            return [[] for _ in range(len(faces))]
+        
+        predictions = self._predict('classifier', model, faces)
+        return self._rank_predictions(predictions, label_encoder, top_k, candidates)
+    
+    def _rank_predictions(self, predictions, label_encoder, top_k=1, candidates=None):
+        """Top-k (label, probability) pairs per row of classifier output"""
+        return rank_predictions(predictions, label_encoder.classes_, top_k, candidates)
+    
+    def classify_crops(self, crops, top_k=1):
+        """Score already-cropped 224x224 BGR faces; returns top-k (label, confidence) pairs per crop"""
+        if not self.is_ready():
+            raise ValueError("Model not trained yet. Please train the model first.")
+        return self._classify_faces([self._preprocess(crop) for crop in crops], top_k=top_k)
+    
+    def _classifier_head(self, model):
+        """The dense layers of a classifier as a model over pooled backbone features"""
+        cached = self._classifier_head_cache
+        if cached is None or cached[0] is not model:
+            head = tf.keras.Sequential([tf.keras.layers.InputLayer(input_shape=(FEATURE_DIM,))] + model.layers[2:])
+            cached = self._classifier_head_cache = (model, head)
+        return cached[1]
+    
+    def analyse_crop(self, crop, top_k=3):
+        """Backbone features and best matches for one 224x224 BGR face crop
+        
+        The backbone runs once; its pooled features feed both the similarity
+        search / classifier head and, via ``enroll_face``, the enrolment.
+        Returns ``(features, candidates)``; candidates are empty while no
+        model is trained.
+        """
+        features = self._backbone_features([self._preprocess(crop)])
+        if not self.is_ready():
+            return features[0], []
+        
+        if self.mode == EMBEDDING_MODE:
+            candidates = self.search_embeddings(self._normalise(features), top_k=top_k)[0]
+        else:
+            with self._model_lock:
+                model, label_encoder = self.model, self.label_encoder
+            predictions = self._predict('classifier_head', self._classifier_head(model), features)
+            candidates = self._rank_predictions(predictions, label_encoder, top_k)[0]
+        return features[0], candidates
+    
+    def enroll_face(self, face_image_id, user_id, image_path, features):
+        """Enrol a saved face image using features from ``analyse_crop``
+        
+        The features are cached under the image's content hash so retraining
+        does not recompute them; in embedding mode the face is appended to the
+        gallery straight away.
+        """
+        self.feature_cache.put(self.feature_cache.file_hash(image_path), features)
+        
+        if self.mode != EMBEDDING_MODE:
+            return None
+        
+        # The first load reconciles with the database and then reads the cached features
+        self._ensure_gallery()
+        if str(face_image_id) not in self.embedding_store:
+            self.enroll_embeddings(
+                [str(face_image_id)], [str(user_id)], self._normalise(np.asarray(features, dtype=np.float32)[np.newaxis])
+            )
+        return {
+            'num_samples': len(self.embedding_store),
+            'num_classes': len(set(self.embedding_store.labels))
+        }
+    
+    def _valid_user_ids(self):
+        """Ids of users that still have at least one face image"""
+        from .enrolled_users import enrolled_users
+        return enrolled_users.get()
+    
+    def _match_results(self, faces, candidate_lists, valid_user_ids, threshold=None):
+        """Turn per-face candidate lists into recognition results"""
         results = []
         
-        for face_location in faces:
-            face = self.extract_face(image, face_location)
-            face = np.expand_dims(face, axis=0)  # Add batch dimension
-            
-            predictions = self.model.predict(face)
-            predicted_index = np.argmax(predictions[0])
-            confidence = float(predictions[0][predicted_index])
+        for face_location, candidates in zip(faces, candidate_lists):
+            candidates = [c for c in candidates if c[0] in valid_user_ids]
+            if not candidates:
+                continue
             
-            predicted_label = self.label_encoder.inverse_transform([predicted_index])[0]
+            predicted_label, confidence = candidates[0]
+            if threshold is not None and confidence < threshold:
+                continue
             
-            if predicted_label in valid_user_ids:
-                x, y, w, h = face_location
-                results.append({
-                    'label': predicted_label,
-                    'confidence': confidence,
-                    'location': (x, y, w, h)
-                })
+            x, y, w, h = face_location
+            results.append({
+                'label': predicted_label,
+                'confidence': confidence,
+                'location': (int(x), int(y), int(w), int(h)),
+                'candidates': [
+                    {'label': label, 'confidence': score} for label, score in candidates
+                ]
+            })
         
         return results
     
+    def recognize_face(self, image, top_k=1, threshold=None, timer=None, faces=None, candidates=None):
+        """Recognize faces in the given image
+        
+        Each result holds the best ``label``/``confidence`` and the ``top_k``
+        ``candidates``. Faces whose best match is below ``threshold`` are dropped.
+        Pass ``faces`` to reuse existing detections, ``candidates`` to match
+        only against a set of user ids (e.g. a session's target users) and a
+        ``StageTimer`` to collect per-stage timings.
+        """
+        timer = timer or StageTimer()
+        
+        if not self.is_ready():
+            raise ValueError("Model not trained yet. Please train the model first.")
+        
+        if faces is None:
+            with timer.stage('detect'):
+                faces = self.detect_faces(image)
+        
+        if len(faces) == 0:
+            return []
+        
+        with timer.stage('lookup_users'):
+            valid_user_ids = self._valid_user_ids()
+            if candidates is not None:
+                valid_user_ids = valid_user_ids & frozenset(str(c) for c in candidates)
+                if not valid_user_ids:
+                    return []
+        
+        with timer.stage('extract'):
+            crops = [self.extract_face(image, face_location) for face_location in faces]
+        
+        with timer.stage('inference'):
+            candidate_lists = self._classify_faces(
+                crops,
+                top_k=top_k,
+                candidates=valid_user_ids if candidates is not None else None
+            )
+        
+        return self._match_results(faces, candidate_lists, valid_user_ids, threshold)
+    
 
-    def recognize_faces_batch(self, image_paths):
-        """Recognize faces in multiple images"""
+    def recognize_faces_batch(self, image_paths, timer=None):
+        """Recognize faces in multiple images
+        
+        Crops from every image are stacked and classified together.
+        """
+        timer = timer or StageTimer()
+        
+        if not self.is_ready():
+            raise ValueError("Model not trained yet. Please train the model first.")
+        
         results = {}
         
-        from camera.models import FaceImage
-        from users.models import User
+        with timer.stage('lookup_users'):
+            valid_user_ids = self._valid_user_ids()
         
-        valid_user_ids = set()
-        for user in User.objects.all():
-            if FaceImage.objects.filter(user=user).exists():
-                valid_user_ids.add(str(user.id))
+        detections = []
+        crops = []
         
         for image_path in image_paths:
+            results[image_path] = []
             try:
-                image = cv2.imread(image_path)
-                if image is not None:
+                with timer.stage('decode'):
+                    image = cv2.imread(image_path)
+                if image is None:
+                    continue
+                
+                with timer.stage('detect'):
                     faces = self.detect_faces(image)
-                    
-                    if len(faces) == 0:
-                        results[image_path] = []
-                        continue
-                    
-                    batch_results = []
-                    
+                
+                with timer.stage('extract'):
                     for face_location in faces:
-                        face = self.extract_face(image, face_location)
-                        face = np.expand_dims(face, axis=0)  # Add batch dimension
-                        
-                        predictions = self.model.predict(face)
-                        predicted_index = np.argmax(predictions[0])
-                        confidence = float(predictions[0][predicted_index])
-                        
-                        predicted_label = self.label_encoder.inverse_transform([predicted_index])[0]
-                        
-                        if predicted_label in valid_user_ids:
-                            x, y, w, h = face_location
-                            batch_results.append({
-                                'label': predicted_label,
-                                'confidence': confidence,
-                                'location': (x, y, w, h)
-                            })
-                    
-                    results[image_path] = batch_results
-                else:
-                    results[image_path] = []
+                        crops.append(self.extract_face(image, face_location))
+                        detections.append((image_path, face_location))
             except Exception as e:
                 print(f"Error processing {image_path}: {str(e)}")
-                results[image_path] = []
+        
+        with timer.stage('inference'):
+            candidate_lists = self._classify_faces(crops)
+        
+        for (image_path, face_location), candidates in zip(detections, candidate_lists):
+            for result in self._match_results([face_location], [candidates[:1]], valid_user_ids):
+                del result['candidates']
+                results[image_path].append(result)
         
         return results
 
-    def update_model_for_user(self, user_id, image_paths):
+    def update_model_for_user(self, user_id, image_paths, face_image_ids=None):
         """Update the model specifically for a user with new images"""
-        all_user_images = []
-        all_user_labels = []
-        
-        from camera.models import FaceImage
-        from users.models import User
+        if self.mode == EMBEDDING_MODE:
+            # The first load reconciles with the database, which already holds the new images
+            self._ensure_gallery()
+            
+            keys = [str(key) for key in face_image_ids] if face_image_ids else self._face_image_keys(image_paths)
+            pending = [(key, path) for key, path in zip(keys, image_paths) if key not in self.embedding_store]
+            if pending:
+                keys, image_paths = map(list, zip(*pending))
+                keys, labels, embeddings = self._embed_images(keys, image_paths, [str(user_id)] * len(keys))
+                if not keys:
+                    raise ValueError("No valid faces found in the provided images")
+            
+                # Enrolment is a gallery append, no retraining required
+                self.enroll_embeddings(keys, labels, embeddings)
+            return {
+                'num_samples': len(self.embedding_store),
+                'num_classes': len(set(self.embedding_store.labels))
+            }
         
-        users = User.objects.all()
+        from camera.dataset import build_dataset
         
-        for user in users:
-            face_images = FaceImage.objects.filter(user=user)
-            
-            for face_img in face_images:
-                img_path = os.path.join(settings.MEDIA_ROOT, face_img.image_path)
-                if os.path.exists(img_path):
-                    all_user_images.append(img_path)
-                    all_user_labels.append(str(user.id))  # Use user ID as label
+        dataset = build_dataset()
+        all_user_images = list(dataset.image_paths)
+        all_user_labels = list(dataset.labels)
         
+        # The new images may not have FaceImage records yet
+        known_paths = set(os.path.normpath(path) for path in all_user_images)
         for img_path in image_paths:
-            all_user_images.append(img_path)
-            all_user_labels.append(str(user_id))
+            if os.path.normpath(img_path) not in known_paths:
+                all_user_images.append(img_path)
+                all_user_labels.append(str(user_id))
         
         return self.train_model(all_user_images, all_user_labels)
 
-face_recognition_model = FaceRecognitionModel()
\ No newline at end of file
+# Importing this module pulls in TensorFlow; most code should import the lazy
+# handle from model_handle instead, which creates the model on first use
+from .model_handle import face_recognition_model
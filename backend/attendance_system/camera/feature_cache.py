@@ -0,0 +1,66 @@
+# camera/feature_cache.py
+import hashlib
+import os
+
+import numpy as np
+from django.conf import settings
+
+
+class FeatureCache:
+    """Pooled backbone features per image, keyed by file content hash, backbone version and detector
+
+    Each entry is a small .npy file under ``<directory>/<version>/<detector>/``.
+    An empty array records that no face was found in the image, so the image
+    is not re-detected on every retrain either. Both kinds of entry depend on
+    the detector settings, so changing them starts a fresh cache.
+    """
+
+    def __init__(self, directory, version, detector=''):
+        self.directory = os.path.join(directory, version, detector)
+
+    @staticmethod
+    def file_hash(path, chunk_size=1 << 20):
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.npy')
+
+    def get(self, key):
+        """Cached features, an empty array for "no face", or None on a miss"""
+        try:
+            return np.load(self._path(key))
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, features):
+        """Store features for a key; pass None to record that no face was found"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        features = np.zeros(0, dtype=np.float32) if features is None else np.asarray(features, dtype=np.float32)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, features)
+        os.replace(tmp_path, path)
+
+    def discard(self, key):
+        """Drop the entry for a key, so the image is processed again on the next retrain"""
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+def default_feature_cache():
+    """The cache the face recognition model uses, without importing TensorFlow"""
+    from .face_detector import face_detector
+    from .model_handle import EMBEDDING_VERSION
+
+    return FeatureCache(
+        os.path.join(settings.BASE_DIR, 'camera', 'models', 'features'), EMBEDDING_VERSION, detector=face_detector.signature
+    )
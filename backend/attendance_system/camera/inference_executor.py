@@ -0,0 +1,53 @@
+# camera/inference_executor.py
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class ExecutorBusy(Exception):
+    """Raised when too many inference calls are already queued"""
+
+
+class InferenceExecutor:
+    """Bounded thread pool for CPU-bound detection and inference called from async views
+
+    At most ``max_workers`` calls run at once and at most ``max_pending`` are
+    accepted in total; beyond that ``submit`` raises ExecutorBusy instead of
+    queueing without limit.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = max_workers or getattr(settings, 'FACE_INFERENCE_WORKERS', 2)
+        self.max_pending = max(self.max_workers, max_pending or getattr(settings, 'FACE_INFERENCE_MAX_PENDING', 8))
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='face-inference')
+        return self._executor
+
+    @property
+    def pending(self):
+        return self._pending
+
+    async def submit(self, function, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ExecutorBusy(f"{self._pending} inference calls already queued")
+            self._pending += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), lambda: function(*args, **kwargs))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+inference_executor = InferenceExecutor()
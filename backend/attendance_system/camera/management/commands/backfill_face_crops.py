@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from camera.feature_cache import default_feature_cache
+from camera.models import FaceImage
+from camera.preprocessing import backfill_face_crop, face_crop_path, map_images
+import os
+from tqdm import tqdm
+
+class Command(BaseCommand):
+    help = 'Detect and store face crops for face images registered before crops were kept'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Recompute crops for images that already have one and drop their cached features',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Processes used to decode images and detect faces (default: FACE_PREPROCESS_WORKERS)',
+        )
+
+    def handle(self, *args, **options):
+        image_paths = [
+            os.path.join(settings.MEDIA_ROOT, image_path)
+            for image_path in FaceImage.objects.order_by().values_list('image_path', flat=True).iterator()
+        ]
+        image_paths = [
+            image_path for image_path in image_paths
+            if os.path.exists(image_path) and (options['force'] or not os.path.exists(face_crop_path(image_path)))
+        ]
+
+        if not image_paths:
+            self.stdout.write(self.style.SUCCESS('All face images already have crops'))
+            return
+
+        self.stdout.write(self.style.NOTICE(f'Backfilling crops for {len(image_paths)} face images...'))
+
+        with tqdm(total=len(image_paths)) as progress_bar:
+            results = map_images(
+                backfill_face_crop,
+                image_paths,
+                workers=options['workers'],
+                progress=lambda done, total: progress_bar.update(done - progress_bar.n)
+            )
+
+        stored = 0
+        failed = 0
+        for crop_path, message in results:
+            if crop_path is None:
+                self.stdout.write(self.style.WARNING(message))
+                failed += 1
+            else:
+                stored += 1
+
+        if options['force']:
+            # Cached features were computed from the previous crops; drop them so retraining uses the new ones
+            feature_cache = default_feature_cache()
+            discarded = sum(feature_cache.discard(feature_cache.file_hash(image_path)) for image_path in image_paths)
+            self.stdout.write(f'Dropped cached features for {discarded} face images')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored crops for {stored} face images ({failed} without a detectable face)'
+        ))
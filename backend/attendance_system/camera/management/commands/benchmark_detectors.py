@@ -0,0 +1,108 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from camera.face_detector import BACKENDS
+from camera.preprocessing import CROP_DIRECTORY
+import os
+import time
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+class Command(BaseCommand):
+    help = 'Compare face detector backends by latency and recall on the images in MEDIA_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends',
+            type=str,
+            default=','.join(BACKENDS),
+            help=f"Comma-separated backends to compare (default: {','.join(BACKENDS)})"
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=0,
+            help='Only use the first N images (default: all)'
+        )
+
+    def _collect_images(self, limit):
+        image_paths = []
+        for root, dirs, files in os.walk(settings.MEDIA_ROOT):
+            # Skip scratch files and the stored 224x224 face crops; only full frames are benchmarked
+            dirs[:] = sorted(d for d in dirs if d not in ('temp', CROP_DIRECTORY))
+            for filename in sorted(files):
+                if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    image_paths.append(os.path.join(root, filename))
+        return image_paths[:limit] if limit else image_paths
+
+    def handle(self, *args, **options):
+        backends = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        unknown = [name for name in backends if name not in BACKENDS]
+        if unknown:
+            raise CommandError(f"Unknown backends: {', '.join(unknown)}. Choose from: {', '.join(BACKENDS)}")
+
+        image_paths = self._collect_images(options['limit'])
+        if not image_paths:
+            raise CommandError(f'No images found under {settings.MEDIA_ROOT}')
+
+        images = [image for image in (cv2.imread(path) for path in image_paths) if image is not None]
+        if not images:
+            raise CommandError(f'No readable images under {settings.MEDIA_ROOT} ({len(image_paths)} files failed to decode)')
+        self.stdout.write(f'Loaded {len(images)} images from {settings.MEDIA_ROOT}')
+
+        # An empty ESP32-sized frame exercises the no-face path, which is the slowest for Haar
+        empty_frame = np.full((768, 1024, 3), 127, dtype=np.uint8)
+
+        rows = []
+        for name in backends:
+            try:
+                detector = BACKENDS[name]()
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f'Skipping {name}: {str(e)}'))
+                continue
+
+            # Warm up so one-off initialisation is not counted
+            detector.detect(images[0])
+
+            latencies = []
+            found = 0
+            multiple = 0
+            for image in tqdm(images, desc=name):
+                start = time.perf_counter()
+                faces = detector.detect(image)
+                latencies.append((time.perf_counter() - start) * 1000)
+                found += len(faces) > 0
+                multiple += len(faces) > 1
+
+            empty_latencies = []
+            for _ in range(5):
+                start = time.perf_counter()
+                detector.detect(empty_frame)
+                empty_latencies.append((time.perf_counter() - start) * 1000)
+
+            rows.append((
+                name,
+                np.mean(latencies),
+                np.percentile(latencies, 50),
+                np.percentile(latencies, 95),
+                np.median(empty_latencies),
+                found / len(images),
+                multiple / len(images)
+            ))
+
+        if not rows:
+            raise CommandError('No detector backend could be loaded')
+
+        # Enrolment photos each contain one face, so recall is the share with at least one detection
+        self.stdout.write(
+            f"\n{'backend':<10} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'empty ms':>9} {'recall':>7} {'multi':>6}"
+        )
+        for name, mean, p50, p95, empty, recall, multi in rows:
+            self.stdout.write(
+                f"{name:<10} {mean:>8.1f} {p50:>8.1f} {p95:>8.1f} {empty:>9.1f} {recall:>7.1%} {multi:>6.1%}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nCurrent backend: {getattr(settings, 'FACE_DETECTOR_BACKEND', 'haar')}. "
+            "Set FACE_DETECTOR_BACKEND in settings to switch."
+        ))
@@ -0,0 +1,158 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from camera.model_handle import face_recognition_model
+from camera.models import FaceImage
+from camera.timing import StageTimer
+import os
+import math
+import time
+import cv2
+import numpy as np
+import requests
+
+# ESP32-CAM capture resolution (FRAMESIZE_XGA in esp32_cam.ino)
+FRAME_WIDTH = 1024
+FRAME_HEIGHT = 768
+
+class Command(BaseCommand):
+    help = 'Benchmark capture-to-result recognition latency against the number of faces in a frame'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--image',
+            type=str,
+            help='Image containing one face to tile into frames (default: a registered face image)'
+        )
+        parser.add_argument(
+            '--faces',
+            type=str,
+            default='1,2,4,8,16,32',
+            help='Comma-separated face counts to benchmark (default: 1,2,4,8,16,32)'
+        )
+        parser.add_argument(
+            '--repeats',
+            type=int,
+            default=5,
+            help='Timed runs per face count; the median is reported (default: 5)'
+        )
+        parser.add_argument(
+            '--max-ratio',
+            type=float,
+            default=2.0,
+            help='Fail if per-face latency at the largest count exceeds this multiple of the smallest (default: 2.0)'
+        )
+        parser.add_argument(
+            '--esp32-ip',
+            type=str,
+            help='Also measure /capture round-trip time from this ESP32-CAM'
+        )
+
+    def _load_face_crop(self, image_path):
+        image = cv2.imread(image_path)
+        if image is None:
+            raise CommandError(f'Could not load image {image_path}')
+
+        faces = face_recognition_model.detect_faces(image)
+        if len(faces) == 0:
+            raise CommandError(f'No face detected in {image_path}')
+
+        # Keep some margin around the face so the detector still finds it after tiling
+        x, y, w, h = faces[0]
+        margin_x, margin_y = int(w * 0.4), int(h * 0.4)
+        top, left = max(0, y - margin_y), max(0, x - margin_x)
+        return image[top:y + h + margin_y, left:x + w + margin_x]
+
+    def _build_frame(self, crop, count):
+        """Tile ``count`` copies of the crop onto a fixed-size frame and JPEG-encode it"""
+        columns = math.ceil(math.sqrt(count * FRAME_WIDTH / FRAME_HEIGHT))
+        rows = math.ceil(count / columns)
+        cell_w, cell_h = FRAME_WIDTH // columns, FRAME_HEIGHT // rows
+
+        scale = min(cell_w / crop.shape[1], cell_h / crop.shape[0])
+        tile = cv2.resize(crop, (int(crop.shape[1] * scale), int(crop.shape[0] * scale)))
+
+        frame = np.full((FRAME_HEIGHT, FRAME_WIDTH, 3), 127, dtype=np.uint8)
+        for i in range(count):
+            top = (i // columns) * cell_h
+            left = (i % columns) * cell_w
+            frame[top:top + tile.shape[0], left:left + tile.shape[1]] = tile
+
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        return encoded.tobytes()
+
+    def _run_pipeline(self, jpeg_bytes):
+        """Decode, detect once and classify once, as the recognize_face endpoint does"""
+        timer = StageTimer()
+
+        with timer.stage('decode'):
+            image = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+        with timer.stage('detect'):
+            faces = face_recognition_model.detect_faces(image)
+
+        if len(faces):
+            face_recognition_model.recognize_face(image, timer=timer, faces=faces)
+
+        return len(faces), timer.as_dict()
+
+    def handle(self, *args, **options):
+        if not face_recognition_model.is_ready():
+            raise CommandError('No trained model found. Please train the model first.')
+
+        image_path = options['image']
+        if not image_path:
+            face_image = FaceImage.objects.order_by('-is_primary', '-created_at').first()
+            if face_image is None:
+                raise CommandError('No registered face images found. Pass --image.')
+            image_path = os.path.join(settings.MEDIA_ROOT, face_image.image_path)
+
+        counts = sorted(int(count) for count in options['faces'].split(','))
+        crop = self._load_face_crop(image_path)
+
+        if options['esp32_ip']:
+            latencies = []
+            for _ in range(options['repeats']):
+                start = time.perf_counter()
+                response = requests.get(f"http://{options['esp32_ip']}/capture?t={int(time.time() * 1000)}", timeout=10)
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(f"ESP32 /capture round trip: {np.median(latencies):.1f} ms median")
+
+        # Warm up so graph tracing is not attributed to the first face count
+        self._run_pipeline(self._build_frame(crop, counts[0]))
+
+        self.stdout.write(f"{'faces':>6} {'detected':>9} {'total ms':>9} {'ms/face':>8}  stages (ms)")
+
+        per_face = []
+        for count in counts:
+            frame = self._build_frame(crop, count)
+            runs = [self._run_pipeline(frame) for _ in range(options['repeats'])]
+            detected = runs[0][0]
+            totals = [timings['total'] for _, timings in runs]
+            median_run = runs[int(np.argsort(totals)[len(totals) // 2])][1]
+            median_total = float(np.median(totals))
+
+            if detected:
+                per_face.append((count, median_total / detected))
+
+            stages = ', '.join(f"{name}={ms:.1f}" for name, ms in median_run.items() if name != 'total')
+            self.stdout.write(
+                f"{count:>6} {detected:>9} {median_total:>9.1f} "
+                f"{(median_total / detected if detected else 0):>8.1f}  {stages}"
+            )
+
+        if len(per_face) < 2:
+            self.stdout.write(self.style.WARNING('Not enough frames with detected faces to check scaling'))
+            return
+
+        # Linear scaling keeps the per-face cost flat (batching usually lowers it)
+        ratio = per_face[-1][1] / per_face[0][1]
+        if ratio > options['max_ratio']:
+            raise CommandError(
+                f"Per-face latency grew {ratio:.2f}x from {per_face[0][0]} to {per_face[-1][0]} faces; "
+                f"recognition is scaling super-linearly"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Per-face latency ratio {per_face[-1][0]} vs {per_face[0][0]} faces: {ratio:.2f}x (limit {options['max_ratio']}x)"
+        ))
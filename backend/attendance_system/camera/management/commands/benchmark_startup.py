@@ -0,0 +1,139 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SETUP = 'import django; django.setup(); '
+
+# What each kind of process imports before it can do any work. 'eager model' is
+# the URLconf plus the model load, which is what every process paid when the
+# model was created at import time.
+SCENARIOS = {
+    'django.setup': SETUP,
+    'urlconf': SETUP + 'from django.urls import get_resolver; get_resolver().url_patterns',
+    'eager model': SETUP + (
+        'from django.urls import get_resolver; get_resolver().url_patterns; '
+        'from camera.model_handle import face_recognition_model; face_recognition_model.load()'
+    ),
+}
+
+HEAVY_PACKAGES = ('tensorflow', 'keras', 'sklearn')
+
+
+def parse_importtime(stderr):
+    """Parse ``python -X importtime`` output
+
+    Returns (total self time in us, top-level cumulative us by module, all
+    module names). Summing self times avoids double counting, since a dotted
+    import reports its parent packages at the same level.
+    """
+    total_us = 0
+    top_level = {}
+    loaded = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line.split('|')
+        total_us += int(self_us.split(':')[1])
+        loaded.add(name.strip())
+        # Nested imports are indented by two more spaces per level
+        if not name.startswith('    '):
+            top_level[name.strip()] = int(cumulative_us)
+    return total_us, top_level, loaded
+
+
+class Command(BaseCommand):
+    help = 'Measure process start-up import time (python -X importtime) with the model loaded lazily and eagerly'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeats',
+            type=int,
+            default=3,
+            help='Fresh interpreters started per scenario; the median is reported (default: 3)'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=8,
+            help='Heaviest top-level imports listed per scenario (default: 8)'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Write the results to this JSON file, e.g. to keep a before/after record'
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            help='JSON file written by an earlier --output run to compare against'
+        )
+
+    def _run(self, code):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'attendance_system.settings'))
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True
+        )
+        wall = time.perf_counter() - started
+        if completed.returncode != 0:
+            errors = [line for line in completed.stderr.splitlines() if line.strip() and not line.startswith('import time:')]
+            return None, errors[-1] if errors else f'exit status {completed.returncode}'
+        return (wall, parse_importtime(completed.stderr)), None
+
+    def handle(self, *args, **options):
+        repeats = max(1, options['repeats'])
+        previous = {}
+        if options['compare']:
+            if not os.path.exists(options['compare']):
+                raise CommandError(f"Comparison file {options['compare']} not found")
+            with open(options['compare']) as f:
+                previous = json.load(f)
+
+        results = {}
+        for name, code in SCENARIOS.items():
+            runs = []
+            for _ in range(repeats):
+                run, error = self._run(code)
+                if run is None:
+                    break
+                runs.append(run)
+
+            if not runs:
+                self.stdout.write(self.style.WARNING(f'{name}: failed ({error})'))
+                continue
+
+            _, top_level, loaded = runs[-1][1]
+            results[name] = {
+                'wall_ms': round(1000 * statistics.median(wall for wall, _ in runs), 1),
+                'import_ms': round(statistics.median(imports[0] for _, imports in runs) / 1000, 1),
+                'modules': len(loaded),
+                'heavy': sorted(p for p in HEAVY_PACKAGES if p in loaded),
+                'top': sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:options['top']],
+            }
+
+        self.stdout.write(f"{'scenario':<14}{'wall ms':>10}{'import ms':>11}{'modules':>9}{'before ms':>11}  heavy packages")
+        for name, result in results.items():
+            before = previous.get(name, {}).get('wall_ms')
+            self.stdout.write(
+                f"{name:<14}{result['wall_ms']:>10.1f}{result['import_ms']:>11.1f}{result['modules']:>9}"
+                f"{before if before is not None else '-':>11}  {', '.join(result['heavy']) or 'none'}"
+            )
+
+        for name, result in results.items():
+            self.stdout.write(self.style.NOTICE(f'\nHeaviest imports for {name}:'))
+            for module, cumulative_us in result['top']:
+                self.stdout.write(f'  {cumulative_us / 1000:>9.1f} ms  {module}')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
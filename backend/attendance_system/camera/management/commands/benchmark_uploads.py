@@ -0,0 +1,115 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.test import RequestFactory
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+from camera.decoding import decode_image
+from camera.models import FaceImage
+from camera.parsers import ImageParser, uploaded_image
+from django.core.files.uploadedfile import SimpleUploadedFile
+import base64
+import json
+import os
+import statistics
+import time
+import cv2
+import numpy as np
+
+PARSERS = [JSONParser(), MultiPartParser(), FormParser(), ImageParser()]
+
+class Command(BaseCommand):
+    help = 'Compare request size and server CPU time of base64 JSON, multipart and raw image/jpeg uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--image',
+            type=str,
+            help='JPEG to upload (default: a registered face image, else a synthetic 1024x768 frame)'
+        )
+        parser.add_argument(
+            '--repeats',
+            type=int,
+            default=50,
+            help='Requests parsed and decoded per upload format; the median is reported (default: 50)'
+        )
+
+    def _load_jpeg(self, image_path):
+        if image_path:
+            if not os.path.exists(image_path):
+                raise CommandError(f'Image {image_path} not found')
+            with open(image_path, 'rb') as f:
+                return f.read()
+
+        for relative_path in FaceImage.objects.values_list('image_path', flat=True)[:20]:
+            path = os.path.join(settings.MEDIA_ROOT, relative_path)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    return f.read()
+
+        # Smooth gradient with some shapes so it compresses like a camera frame, not like noise
+        x = np.linspace(0, 255, 1024, dtype=np.float32)
+        y = np.linspace(0, 255, 768, dtype=np.float32)[:, np.newaxis]
+        frame = np.dstack([(x + y) / 2, np.broadcast_to(x, (768, 1024)), np.broadcast_to(y, (768, 1024))]).astype(np.uint8)
+        for i in range(20):
+            cv2.circle(frame, (50 * i + 30, 300 + (i % 5) * 60), 40, (40 * i % 255, 90, 200), -1)
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        return encoded.tobytes()
+
+    def _requests(self, jpeg):
+        """Build one HttpRequest factory per upload format, as the frontend or camera would send it"""
+        factory = RequestFactory()
+        data_url = 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode('ascii')
+        path = '/api/face-recognition/recognize_face/'
+
+        return {
+            'base64 JSON': lambda: factory.post(
+                path,
+                data=json.dumps({'session_id': 'x', 'camera_mode': 'WEBCAM', 'image_data': data_url}),
+                content_type='application/json'
+            ),
+            'multipart': lambda: factory.post(
+                path,
+                data={'session_id': 'x', 'camera_mode': 'WEBCAM', 'image': SimpleUploadedFile('frame.jpg', jpeg, 'image/jpeg')}
+            ),
+            'raw image/jpeg': lambda: factory.post(
+                f'{path}?session_id=x&camera_mode=WEBCAM',
+                data=jpeg,
+                content_type='image/jpeg'
+            ),
+        }
+
+    def handle(self, *args, **options):
+        jpeg = self._load_jpeg(options['image'])
+        repeats = options['repeats']
+        self.stdout.write(self.style.NOTICE(f'Uploading a {len(jpeg) / 1024:.1f} KiB JPEG, {repeats} requests per format'))
+
+        rows = []
+        for name, build_request in self._requests(jpeg).items():
+            body_size = len(build_request().body)
+            parse_times = []
+            decode_times = []
+
+            for _ in range(repeats):
+                http_request = build_request()
+
+                # CPU time the server spends turning the request into image bytes, then pixels
+                start = time.process_time()
+                image_bytes = uploaded_image(Request(http_request, parsers=PARSERS))
+                parsed = time.process_time()
+                image = decode_image(image_bytes)
+                decoded = time.process_time()
+
+                if image is None:
+                    raise CommandError(f'{name}: uploaded image could not be decoded')
+                parse_times.append(parsed - start)
+                decode_times.append(decoded - parsed)
+
+            rows.append((name, body_size, statistics.median(parse_times), statistics.median(decode_times)))
+
+        baseline_size = rows[-1][1]
+        self.stdout.write(f"{'format':<16}{'request':>12}{'vs raw':>9}{'parse ms':>11}{'decode ms':>11}{'total ms':>11}")
+        for name, body_size, parse_time, decode_time in rows:
+            self.stdout.write(
+                f"{name:<16}{body_size / 1024:>10.1f}Ki{body_size / baseline_size:>8.2f}x"
+                f"{1000 * parse_time:>11.2f}{1000 * decode_time:>11.2f}{1000 * (parse_time + decode_time):>11.2f}"
+            )
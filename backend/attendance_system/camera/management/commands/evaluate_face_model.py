@@ -1,7 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from camera.face_recognition_model import face_recognition_model
-from camera.models import FaceImage
+from camera.model_handle import face_recognition_model
+from camera.preprocessing import load_face_crops
+from camera.dataset import build_dataset
 from users.models import User
 import os
 import cv2
@@ -32,7 +33,7 @@ class Command(BaseCommand):
     
     def handle(self, *args, **options):
         # Check if model exists
-        if face_recognition_model.model is None:
+        if not face_recognition_model.is_ready():
             self.stdout.write(self.style.ERROR('No trained model found. Please train the model first.'))
             return
         
@@ -41,21 +42,13 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.NOTICE('Starting face recognition model evaluation...'))
         
-        # Collect all images
-        all_images = []
-        all_labels = []
-        user_names = {}  # Map user IDs to names for reporting
+        # Collect all images in one query
+        dataset = build_dataset()
+        all_images = dataset.image_paths
+        all_labels = dataset.labels
         
-        users = User.objects.all()
-        for user in users:
-            face_images = FaceImage.objects.filter(user=user)
-            user_names[str(user.id)] = user.name
-            
-            for face_img in face_images:
-                img_path = os.path.join(settings.MEDIA_ROOT, face_img.image_path)
-                if os.path.exists(img_path):
-                    all_images.append(img_path)
-                    all_labels.append(str(user.id))
+        # Map user IDs to names for reporting
+        user_names = {str(user_id): name for user_id, name in User.objects.values_list('id', 'name')}
         
         # Check if we have enough images
         if len(all_images) < 5:
@@ -116,26 +109,30 @@ class Command(BaseCommand):
         y_pred = []
         confidences = []
         
-        # Process each test image
-        for img_path, true_label in tqdm(zip(test_images, test_labels), total=len(test_images)):
-            try:
-                # Load and process image
-                image = cv2.imread(img_path)
-                if image is None:
-                    continue
-                
-                # Get prediction
-                results = face_recognition_model.recognize_face(image)
-                
-                if results:
-                    pred_label = results[0]['label']
-                    confidence = results[0]['confidence']
+        # Read the stored face crops (detecting only for images without one) and classify them in one batch
+        with tqdm(total=len(test_images)) as progress_bar:
+            crop_results = load_face_crops(
+                test_images,
+                progress=lambda done, total: progress_bar.update(done - progress_bar.n)
+            )
+        
+        crops = []
+        crop_labels = []
+        for img_path, true_label, (crop, message) in zip(test_images, test_labels, crop_results):
+            if crop is None:
+                self.stdout.write(self.style.WARNING(message))
+                continue
+            crops.append(crop)
+            crop_labels.append(true_label)
+        
+        if crops:
+            for true_label, candidates in zip(crop_labels, face_recognition_model.classify_crops(crops)):
+                if candidates:
+                    pred_label, confidence = candidates[0]
                     
                     y_true.append(true_label)
                     y_pred.append(pred_label)
                     confidences.append(confidence)
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f"Error processing {img_path}: {str(e)}"))
         
         if not y_true:
             self.stdout.write(self.style.ERROR("No valid predictions made. Evaluation failed."))
@@ -169,7 +166,8 @@ class Command(BaseCommand):
         # Plot confidence distribution
         plt.figure(figsize=(10, 6))
         plt.hist(confidences, bins=20, alpha=0.7)
-        plt.axvline(x=0.7, color='r', linestyle='--', label='Confidence Threshold (0.7)')
+        threshold = face_recognition_model.match_threshold
+        plt.axvline(x=threshold, color='r', linestyle='--', label=f'Confidence Threshold ({threshold})')
         plt.xlabel('Confidence')
         plt.ylabel('Count')
         plt.title('Prediction Confidence Distribution')
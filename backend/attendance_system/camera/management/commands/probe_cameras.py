@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from camera.camera_probe import probe_cameras
+import time
+
+class Command(BaseCommand):
+    help = 'Check all ESP32-CAMs concurrently and update their last_connected/is_active status'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--include-inactive',
+            action='store_true',
+            help='Also probe cameras currently marked inactive',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            help='Read timeout per camera in seconds (default: CAMERA_PROBE_TIMEOUT)',
+        )
+
+    def handle(self, *args, **options):
+        timeout = (2, options['timeout']) if options['timeout'] else None
+
+        start_time = time.time()
+        results = probe_cameras(include_inactive=options['include_inactive'], timeout=timeout)
+        elapsed = time.time() - start_time
+
+        if not results:
+            self.stdout.write(self.style.WARNING('No cameras to probe'))
+            return
+
+        for result in results:
+            if result['ok']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"  ✓ {result['name']} ({result['ip_address']}): {result['latency_ms']:.0f} ms"
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f"  ✗ {result['name']} ({result['ip_address']}): {result['error']}"
+                ))
+
+        online = sum(1 for result in results if result['ok'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{online}/{len(results)} cameras online (probed in {elapsed:.1f}s)'
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from camera.training_queue import TrainingWorker
+import time
+
+class Command(BaseCommand):
+    help = 'Run the face recognition training worker in the foreground'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run every pending training job and exit',
+        )
+    
+    def handle(self, *args, **options):
+        worker = TrainingWorker()
+        
+        if options['once']:
+            worker.recover_stale_jobs()
+            jobs = 0
+            while True:
+                job = worker.run_pending()
+                if job is None:
+                    break
+                jobs += 1
+                style = self.style.SUCCESS if job.status == job.STATUS_SUCCEEDED else self.style.ERROR
+                self.stdout.write(style(f'Job {job.id}: {job.status}'))
+            self.stdout.write(f'Processed {jobs} training job(s)')
+            return
+        
+        self.stdout.write(self.style.NOTICE('Training worker started. Press Ctrl+C to stop.'))
+        worker.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            worker.stop()
+            self.stdout.write('Training worker stopped')
@@ -1,10 +1,10 @@
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from camera.face_recognition_model import face_recognition_model
-from camera.models import FaceImage
+from camera.model_handle import face_recognition_model
+from camera.dataset import build_dataset
 from users.models import User
-import os
 import time
+from tqdm import tqdm
 
 class Command(BaseCommand):
     help = 'Train the face recognition model using all available face images'
@@ -15,43 +15,40 @@ class Command(BaseCommand):
             action='store_true',
             help='Force retraining even if model already exists',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Processes used to decode images and extract faces (default: FACE_PREPROCESS_WORKERS)',
+        )
     
     def handle(self, *args, **options):
         start_time = time.time()
         self.stdout.write(self.style.NOTICE('Starting face recognition model training...'))
         
         # Check if model exists and if we should force retrain
-        model_exists = face_recognition_model.model is not None
+        model_exists = face_recognition_model.is_ready()
         force_retrain = options['force']
         
         if model_exists and not force_retrain:
             self.stdout.write(self.style.WARNING('Model already exists. Use --force to retrain.'))
             return
         
-        # Get all user face images
-        all_images = []
-        all_labels = []
+        # Get all user face images in one query
+        dataset = build_dataset()
+        all_images = dataset.image_paths
+        all_labels = dataset.labels
         
         # Show progress
-        users = User.objects.all()
-        self.stdout.write(f'Processing images for {users.count()} users')
+        counts = dataset.counts_by_user()
+        user_names = {str(user_id): name for user_id, name in User.objects.filter(id__in=counts.keys()).values_list('id', 'name')}
+        self.stdout.write(f'Processing images for {len(counts)} users')
         
-        for user in users:
-            face_images = FaceImage.objects.filter(user=user)
-            
-            if face_images.count() > 0:
-                self.stdout.write(f'  - Processing {face_images.count()} images for user {user.name}')
-            
-            valid_images = 0
-            for face_img in face_images:
-                img_path = os.path.join(settings.MEDIA_ROOT, face_img.image_path)
-                if os.path.exists(img_path):
-                    all_images.append(img_path)
-                    all_labels.append(str(user.id))
-                    valid_images += 1
-            
-            if valid_images > 0:
-                self.stdout.write(self.style.SUCCESS(f'    ✓ Found {valid_images} valid images'))
+        for user_id, valid_images in counts.items():
+            self.stdout.write(f'  - {user_names.get(user_id, user_id)}: {valid_images} valid images')
+        
+        missing = dataset.total_images - len(dataset)
+        if missing:
+            self.stdout.write(self.style.WARNING(f'Skipped {missing} face images whose files are missing'))
         
         total_images = len(all_images)
         if total_images < 2:
@@ -63,7 +60,14 @@ class Command(BaseCommand):
         try:
             # Train the model
             self.stdout.write('Training model... (this may take several minutes)')
-            training_results = face_recognition_model.train_model(all_images, all_labels)
+            with tqdm(total=total_images, desc='Preprocessing', unit='img') as progress_bar:
+                def report_progress(done, total):
+                    progress_bar.total = total
+                    progress_bar.update(done - progress_bar.n)
+                
+                training_results = face_recognition_model.train_model(
+                    all_images, all_labels, progress=report_progress, workers=options['workers']
+                )
             
             # Report results
             elapsed_time = time.time() - start_time
@@ -0,0 +1,73 @@
+# camera/matching.py
+import numpy as np
+
+
+def rank_predictions(predictions, class_labels, top_k=1, candidates=None):
+    """Top-k (label, probability) pairs per row of classifier output
+
+    With ``candidates`` only those labels can be returned, but each keeps its
+    probability over all classes. A face the classifier attributes to someone
+    outside the set therefore scores low and fails the recognition threshold
+    instead of being handed to the closest candidate.
+    """
+    predictions = np.asarray(predictions)
+    class_labels = np.asarray(class_labels)
+
+    if candidates is not None:
+        columns = np.flatnonzero(np.isin(class_labels.astype(str), list(candidates)))
+        if len(columns) == 0:
+            return [[] for _ in range(len(predictions))]
+        predictions = predictions[:, columns]
+        class_labels = class_labels[columns]
+
+    top_indices = np.argsort(-predictions, axis=1)[:, :top_k]
+    top_labels = class_labels[top_indices]
+
+    return [
+        [(str(label), float(row[index])) for label, index in zip(labels, indices)]
+        for row, labels, indices in zip(predictions, top_labels, top_indices)
+    ]
+
+
+def search_gallery(embeddings, gallery, identities, inverse, top_k=1, threshold=None, candidates=None):
+    """Top-k (identity, similarity) pairs per query embedding against a gallery
+
+    ``gallery`` holds L2-normalised rows and ``identities[inverse[i]]`` is the
+    identity of row ``i``. Each identity appears at most once per list, scored
+    by its best matching row, and pairs below ``threshold`` are dropped.
+    ``candidates`` limits the search to a set of identities.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim == 1:
+        embeddings = embeddings[np.newaxis, :]
+
+    if len(gallery) == 0:
+        return [[] for _ in range(len(embeddings))]
+
+    if candidates is not None:
+        # Only compare against the gallery rows of the candidate identities
+        keep = np.isin(identities, list(candidates))
+        if not keep.any():
+            return [[] for _ in range(len(embeddings))]
+        rows = keep[inverse]
+        gallery = gallery[rows]
+        inverse = (np.cumsum(keep) - 1)[inverse[rows]]
+        identities = identities[keep]
+
+    # Cosine similarity reduces to a dot product on normalised vectors
+    similarities = embeddings @ gallery.T
+
+    # Collapse rows to one score per identity (best matching image)
+    scores = np.full((len(embeddings), len(identities)), -np.inf, dtype=np.float32)
+    np.maximum.at(scores, (slice(None), inverse), similarities)
+
+    k = min(top_k, len(identities))
+    top_indices = np.argsort(-scores, axis=1)[:, :k]
+
+    results = []
+    for row, indices in zip(scores, top_indices):
+        matches = [(str(identities[i]), float(row[i])) for i in indices]
+        if threshold is not None:
+            matches = [match for match in matches if match[1] >= threshold]
+        results.append(matches)
+    return results
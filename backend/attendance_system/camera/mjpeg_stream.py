@@ -0,0 +1,278 @@
+# camera/mjpeg_stream.py
+import re
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+
+from .camera_client import camera_clients
+
+CONTENT_LENGTH_RE = re.compile(rb'content-length:\s*(\d+)', re.IGNORECASE)
+JPEG_START = b'\xff\xd8'
+JPEG_END = b'\xff\xd9'
+
+
+class MjpegParser:
+    """Incremental parser for ``multipart/x-mixed-replace`` JPEG streams
+
+    Feed it bytes as they arrive; it returns the JPEG frames completed so far.
+    Parts are sliced by their Content-Length header when present and by the
+    JPEG end marker otherwise.
+    """
+
+    def __init__(self, max_frame_bytes=4 * 1024 * 1024):
+        self.max_frame_bytes = max_frame_bytes
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        frames = []
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                break
+            if frame.startswith(JPEG_START):
+                frames.append(frame)
+
+        if len(self._buffer) > self.max_frame_bytes:
+            # Lost sync with the part headers; resume at the next boundary
+            del self._buffer[:-1024]
+        return frames
+
+    def _next_frame(self):
+        buffer = self._buffer
+        header_end = buffer.find(b'\r\n\r\n')
+        if header_end < 0:
+            return None
+        body_start = header_end + 4
+
+        match = CONTENT_LENGTH_RE.search(buffer, 0, header_end)
+        if match is not None:
+            body_end = body_start + int(match.group(1))
+            if len(buffer) < body_end:
+                return None
+        else:
+            marker = buffer.find(JPEG_END, body_start)
+            if marker < 0:
+                return None
+            body_end = marker + len(JPEG_END)
+
+        frame = bytes(buffer[body_start:body_end])
+        del buffer[:body_end]
+        return frame
+
+
+class FrameQueue:
+    """Bounded queue of ``(captured_at, jpeg_bytes)`` that drops the oldest frame when full
+
+    Recognition is slower than the camera, so only the newest frames are
+    worth keeping; ``dropped`` counts the frames that were discarded.
+    """
+
+    def __init__(self, maxsize=2):
+        self._frames = deque(maxlen=maxsize)
+        self._ready = threading.Condition()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, frame):
+        with self._ready:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+            self._frames.append((time.monotonic(), frame))
+            self._ready.notify()
+
+    def get(self, timeout=None, max_age=None):
+        """Pop the oldest frame that is younger than ``max_age`` seconds, or None on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._ready:
+            while True:
+                while self._frames:
+                    captured_at, frame = self._frames.popleft()
+                    if max_age is None or time.monotonic() - captured_at <= max_age:
+                        return captured_at, frame
+                    self.dropped += 1
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._ready.wait(remaining)
+
+    def latest(self, timeout=None, max_age=None):
+        """Return the newest frame, discarding any older ones"""
+        with self._ready:
+            if self._frames:
+                self.dropped += len(self._frames) - 1
+                newest = self._frames.pop()
+                self._frames.clear()
+                self._frames.append(newest)
+        return self.get(timeout=timeout, max_age=max_age)
+
+
+class CameraStream:
+    """Background reader that keeps one long-lived connection to a camera's /stream
+
+    Frames are parsed as they arrive and pushed into ``frames``. Dropped
+    connections are retried with exponential backoff.
+    """
+
+    def __init__(self, camera_id, ip_address, queue_size=None, read_timeout=None, max_backoff=None):
+        self.camera_id = str(camera_id)
+        self.ip_address = ip_address
+        self.frames = FrameQueue(queue_size or getattr(settings, 'CAMERA_STREAM_QUEUE_SIZE', 2))
+        self.read_timeout = read_timeout or getattr(settings, 'CAMERA_STREAM_READ_TIMEOUT', 10)
+        self.max_backoff = max_backoff or getattr(settings, 'CAMERA_STREAM_MAX_BACKOFF', 30)
+
+        self.connected = False
+        self.frames_received = 0
+        self.bytes_received = 0
+        self.reconnects = 0
+        self.last_frame_at = None
+        self.last_error = None
+
+        # Newest frame and its monotonic arrival time, readable without taking it from ``frames``
+        self._last_frame = None
+        self._frame_ready = threading.Condition()
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._response = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run_forever, name=f'camera-stream-{self.camera_id}', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        response = self._response
+        if response is not None:
+            # Unblocks a read that is waiting for the next chunk
+            response.close()
+        if self._thread is not None and timeout is not None:
+            self._thread.join(timeout)
+
+    def run_forever(self):
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                self._read_stream()
+                failures = 0
+            except (requests.exceptions.RequestException, OSError) as e:
+                if self._stop.is_set():
+                    break
+                self.last_error = str(e)
+                failures += 1
+                print(f"Camera stream {self.ip_address}: {str(e)}")
+            finally:
+                self.connected = False
+                self._response = None
+
+            if not self._stop.is_set():
+                self.reconnects += 1
+                self._stop.wait(min(self.max_backoff, 2 ** min(failures, 5)))
+
+    def _read_stream(self):
+        with camera_clients.get(self.ip_address).open_stream(read_timeout=self.read_timeout) as response:
+            self._response = response
+            response.raise_for_status()
+            self.connected = True
+            self.last_error = None
+
+            parser = MjpegParser()
+            for chunk in response.iter_content(chunk_size=16384):
+                if self._stop.is_set():
+                    return
+                self.bytes_received += len(chunk)
+                for frame in parser.feed(chunk):
+                    self.frames.put(frame)
+                    self.frames_received += 1
+                    self.last_frame_at = time.time()
+                    with self._frame_ready:
+                        self._last_frame = (time.monotonic(), frame)
+                        self._frame_ready.notify_all()
+
+    def recent_frame(self, max_age, timeout=None):
+        """The newest frame if it is at most ``max_age`` seconds old, waiting up to ``timeout`` for one
+
+        Unlike ``frames.latest`` this leaves the queue alone, so health checks
+        do not take frames from the recognition worker. Returns None on timeout.
+        """
+        def fresh():
+            last = self._last_frame
+            return last is not None and time.monotonic() - last[0] <= max_age
+
+        with self._frame_ready:
+            if not self._frame_ready.wait_for(fresh, timeout):
+                return None
+            return self._last_frame[1]
+
+    def status(self):
+        return {
+            'camera_id': self.camera_id,
+            'ip_address': self.ip_address,
+            'running': self.is_running(),
+            'connected': self.connected,
+            'frames_received': self.frames_received,
+            'frames_dropped': self.frames.dropped,
+            'bytes_received': self.bytes_received,
+            'reconnects': self.reconnects,
+            'last_frame_at': self.last_frame_at,
+            'last_error': self.last_error,
+        }
+
+
+class CameraStreamManager:
+    """Process-wide registry holding at most one CameraStream per CameraConfiguration"""
+
+    def __init__(self):
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def start(self, camera):
+        """Start (or return the running) stream for a CameraConfiguration"""
+        camera_id = str(camera.id)
+        with self._lock:
+            stream = self._streams.get(camera_id)
+            if stream is not None and stream.ip_address != camera.ip_address:
+                stream.stop()
+                stream = None
+            if stream is None:
+                stream = CameraStream(camera_id, camera.ip_address)
+                self._streams[camera_id] = stream
+            stream.start()
+            return stream
+
+    def stop(self, camera_id):
+        with self._lock:
+            stream = self._streams.pop(str(camera_id), None)
+        if stream is not None:
+            stream.stop()
+        return stream
+
+    def get(self, camera_id):
+        return self._streams.get(str(camera_id))
+
+    def for_ip(self, ip_address):
+        """The running stream reading from ``ip_address``, if any"""
+        for stream in list(self._streams.values()):
+            if stream.ip_address == ip_address and stream.is_running():
+                return stream
+        return None
+
+    def status(self):
+        return [stream.status() for stream in list(self._streams.values())]
+
+
+camera_streams = CameraStreamManager()
@@ -0,0 +1,99 @@
+# camera/model_handle.py
+import threading
+
+from django.conf import settings
+
+# Recognition modes: 'classifier' uses the trained softmax head, 'embedding'
+# matches L2-normalised backbone embeddings against an enrolled gallery
+CLASSIFIER_MODE = 'classifier'
+EMBEDDING_MODE = 'embedding'
+
+# Bump when the backbone or preprocessing changes so stale embeddings and cached features are rebuilt
+EMBEDDING_VERSION = 'mobilenet_v2-imagenet-avg-224-v1'
+
+
+class LazyFaceRecognitionModel:
+    """Process-wide handle to the FaceRecognitionModel, created on first use
+
+    Importing TensorFlow and loading the ``.h5`` take seconds, so nothing is
+    imported until an attribute of the model is needed (the first recognition
+    or enrolment) or ``load()`` is called explicitly. Management commands and
+    web workers that never recognise a face never pay for it.
+    """
+
+    def __init__(self):
+        self._model = None
+        self._lock = threading.Lock()
+        self._warmup_thread = None
+        self.warmup_error = None
+
+    @property
+    def is_loaded(self):
+        return self._model is not None
+
+    @property
+    def mode(self):
+        # Answered from settings so callers can branch on the mode without a load
+        if self._model is not None:
+            return self._model.mode
+        return getattr(settings, 'FACE_RECOGNITION_MODE', CLASSIFIER_MODE)
+
+    def load(self):
+        """Import TensorFlow and load the model now, returning the FaceRecognitionModel"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from .face_recognition_model import FaceRecognitionModel
+                    self._model = FaceRecognitionModel()
+        return self._model
+
+    def start_warm_up(self):
+        """Load and warm up the model on a background thread; readiness reports warming meanwhile"""
+        with self._lock:
+            if self._warmup_thread is not None and self._warmup_thread.is_alive():
+                return self._warmup_thread
+            self._warmup_thread = threading.Thread(target=self._warm_up_in_background, name='face-model-warmup', daemon=True)
+            self._warmup_thread.start()
+            return self._warmup_thread
+
+    def _warm_up_in_background(self):
+        try:
+            self.load().warm_up()
+            self.warmup_error = None
+        except Exception as e:
+            self.warmup_error = str(e)
+            print(f"Face recognition model warm-up failed: {str(e)}")
+
+    def readiness(self):
+        """Whether this process has loaded and warmed the model, without loading it
+
+        ``ready`` is what load balancers should route on: the model is loaded
+        and has run its warm-up batches.
+        """
+        if self._model is not None:
+            status = self._model.warmup_status()
+        else:
+            status = {'loaded': False, 'warmed': False, 'mode': self.mode, 'version': EMBEDDING_VERSION}
+        status['warming'] = self._warmup_thread is not None and self._warmup_thread.is_alive()
+        status['warmup_error'] = self.warmup_error
+        status['ready'] = status['loaded'] and status['warmed']
+        return status
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
+face_recognition_model = LazyFaceRecognitionModel()
+
+
+def preload_face_model():
+    """Prepare the model while a web worker starts, as configured in settings
+
+    FACE_MODEL_WARMUP loads and warms it on a background thread, so the
+    readiness endpoint can answer while it runs; FACE_MODEL_PRELOAD only
+    loads it, before the worker serves requests.
+    """
+    if getattr(settings, 'FACE_MODEL_WARMUP', False):
+        face_recognition_model.start_warm_up()
+    elif getattr(settings, 'FACE_MODEL_PRELOAD', False):
+        face_recognition_model.load()
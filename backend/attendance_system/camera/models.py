@@ -1,5 +1,7 @@
 import uuid
 from django.db import models
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
 
 class CameraConfiguration(models.Model):
     id = models.UUIDField(primary_key=True, editable=False, default=uuid.uuid4, unique=True)
@@ -27,4 +29,42 @@ class FaceImage(models.Model):
         return f"Face image for {self.user.name}"
     
     class Meta:
-        ordering = ['user', '-created_at']
\ No newline at end of file
+        ordering = ['user', '-created_at']
+
+@receiver(post_save, sender=FaceImage)
+@receiver(post_delete, sender=FaceImage)
+def invalidate_enrolled_users(sender, instance, **kwargs):
+    """Drop the cached set of enrolled users when face images change"""
+    from .enrolled_users import enrolled_users
+    enrolled_users.invalidate()
+
+class TrainingJob(models.Model):
+    STATUS_PENDING = 'PENDING'
+    STATUS_RUNNING = 'RUNNING'
+    STATUS_SUCCEEDED = 'SUCCEEDED'
+    STATUS_FAILED = 'FAILED'
+
+    id = models.UUIDField(primary_key=True, editable=False, default=uuid.uuid4, unique=True)
+    reason = models.CharField(max_length=50, default='manual')
+    status = models.CharField(
+        max_length=10,
+        choices=[
+            (STATUS_PENDING, 'Pending'),
+            (STATUS_RUNNING, 'Running'),
+            (STATUS_SUCCEEDED, 'Succeeded'),
+            (STATUS_FAILED, 'Failed'),
+        ],
+        default=STATUS_PENDING
+    )
+    request_count = models.PositiveIntegerField(default=1)  # Requests coalesced into this job
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Training job {self.id} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
@@ -0,0 +1,56 @@
+# camera/parsers.py
+from rest_framework.fields import BooleanField
+from rest_framework.parsers import BaseParser
+
+from .decoding import decode_base64_image
+
+
+class ImageParser(BaseParser):
+    """Accept a raw encoded image body (e.g. ``Content-Type: image/jpeg``) as bytes
+
+    Other request fields are then read from the query string.
+    """
+    media_type = 'image/*'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream.read() if stream is not None else b''
+
+
+def request_param(request, name, default=None):
+    """A request field from the JSON/form body, or from the query string for raw image bodies"""
+    if isinstance(request.data, bytes):
+        return request.query_params.get(name, default)
+    return request.data.get(name, request.query_params.get(name, default))
+
+
+def request_flag(request, name, default=False):
+    """A boolean request field, accepting JSON booleans and strings like "true"/"false"/"1"/"0"
+
+    Raises ValueError for anything else.
+    """
+    value = request_param(request, name)
+    if value is None or value == '':
+        return default
+    if value in BooleanField.TRUE_VALUES:
+        return True
+    if value in BooleanField.FALSE_VALUES:
+        return False
+    raise ValueError(f"'{name}' must be true or false")
+
+
+def uploaded_image(request):
+    """Encoded image bytes from a raw image body, a multipart ``image`` file or base64 ``image_data``
+
+    Returns None when the request carries no image.
+    """
+    if isinstance(request.data, bytes):
+        return request.data or None
+
+    uploaded = request.FILES.get('image')
+    if uploaded is not None:
+        return uploaded.read()
+
+    image_data = request.data.get('image_data')  # Base64 encoded image
+    if image_data:
+        return decode_base64_image(image_data)
+    return None
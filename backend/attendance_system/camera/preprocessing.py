@@ -0,0 +1,136 @@
+# camera/preprocessing.py
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+from django.conf import settings
+
+FACE_SIZE = (224, 224)
+CROP_DIRECTORY = 'crops'
+
+
+def _init_worker():
+    # Spawned workers start from a clean interpreter and need Django settings for the detector
+    import django
+    django.setup()
+
+
+def face_crop_path(image_path):
+    """Path of the stored face crop for an enrolment image (``<dir>/crops/<name>``)"""
+    directory, filename = os.path.split(image_path)
+    return os.path.join(directory, CROP_DIRECTORY, filename)
+
+
+def detect_face_crop(image, required_size=FACE_SIZE):
+    """Detect the largest face in a BGR image
+
+    Returns ``(crop, box)`` with a resized uint8 crop and its (x, y, w, h) box,
+    or ``(None, None)`` when no face is found.
+    """
+    from .face_detector import face_detector
+
+    return crop_largest_face(image, face_detector.detect(image), required_size)
+
+
+def crop_largest_face(image, faces, required_size=FACE_SIZE):
+    """Crop the largest of already-detected (x, y, w, h) faces; returns ``(crop, box)`` or ``(None, None)``"""
+    if len(faces) == 0:
+        return None, None
+
+    x, y, width, height = max(faces, key=lambda box: box[2] * box[3])
+    crop = cv2.resize(image[y:y+height, x:x+width], required_size)
+    return crop, (int(x), int(y), int(width), int(height))
+
+
+def save_face_crop(crop, image_path):
+    """Write a face crop next to its enrolment image and return the crop path"""
+    crop_path = face_crop_path(image_path)
+    os.makedirs(os.path.dirname(crop_path), exist_ok=True)
+    cv2.imwrite(crop_path, crop, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    return crop_path
+
+
+def load_face_crop(image_path, required_size=FACE_SIZE):
+    """Load the face crop for an image, reading the stored crop when there is one
+
+    Returns ``(crop, None)`` with a resized BGR uint8 crop, or ``(None, message)``.
+    Kept free of TensorFlow so it can run in lightweight worker processes.
+    """
+    try:
+        crop_path = face_crop_path(image_path)
+        if os.path.exists(crop_path):
+            crop = cv2.imread(crop_path)
+            if crop is not None:
+                if crop.shape[1::-1] != tuple(required_size):
+                    crop = cv2.resize(crop, required_size)
+                return crop, None
+
+        image = cv2.imread(image_path)
+        if image is None:
+            return None, f"Warning: Could not load image {image_path}"
+
+        crop, _ = detect_face_crop(image, required_size)
+        if crop is None:
+            return None, f"Warning: No face detected in {image_path}"
+        return crop, None
+    except Exception as e:
+        return None, f"Error processing image {image_path}: {str(e)}"
+
+
+def backfill_face_crop(image_path):
+    """Detect and store the crop for an enrolment image; returns ``(crop_path, message)``"""
+    try:
+        image = cv2.imread(image_path)
+        if image is None:
+            return None, f"Warning: Could not load image {image_path}"
+
+        crop, _ = detect_face_crop(image)
+        if crop is None:
+            return None, f"Warning: No face detected in {image_path}"
+
+        return save_face_crop(crop, image_path), None
+    except Exception as e:
+        return None, f"Error processing image {image_path}: {str(e)}"
+
+
+def map_images(function, image_paths, workers=None, progress=None):
+    """Apply ``function`` to image paths, in input order, across a process pool
+
+    ``workers`` defaults to ``FACE_PREPROCESS_WORKERS``; small batches and a
+    worker count of 1 stay in-process. ``progress(done, total)`` is called as
+    images complete.
+    """
+    if workers is None:
+        workers = getattr(settings, 'FACE_PREPROCESS_WORKERS', 1)
+    total = len(image_paths)
+
+    if workers > 1 and total >= 2 * workers:
+        # Spawn rather than fork: forking after TensorFlow has started can deadlock
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+        chunksize = max(1, min(16, total // (workers * 4)))
+        with executor:
+            results_iter = executor.map(function, image_paths, chunksize=chunksize)
+            results = _collect(results_iter, total, progress)
+    else:
+        results = _collect((function(path) for path in image_paths), total, progress)
+
+    return results
+
+
+def load_face_crops(image_paths, workers=None, progress=None):
+    """Load face crops for many images; returns one ``(crop, message)`` pair per path"""
+    return map_images(load_face_crop, image_paths, workers=workers, progress=progress)
+
+
+def _collect(results_iter, total, progress):
+    results = []
+    for result in results_iter:
+        results.append(result)
+        if progress is not None:
+            progress(len(results), total)
+    return results
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import CameraConfiguration, FaceImage
+from .models import CameraConfiguration, FaceImage, TrainingJob
 from urllib.parse import urljoin
 from django.conf import settings
 import os
@@ -23,4 +23,10 @@ class FaceImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = FaceImage
         fields = ['id', 'user', 'image_path', 'is_primary', 'created_at']
-        read_only_fields = ['created_at']
\ No newline at end of file
+        read_only_fields = ['created_at']
+
+class TrainingJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TrainingJob
+        fields = ['id', 'reason', 'status', 'request_count', 'result', 'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
@@ -0,0 +1,48 @@
+# camera/session_candidates.py
+import threading
+import time
+
+from django.conf import settings
+
+
+class SessionCandidateCache:
+    """In-process map of AttendanceSession id to the ids of its target users
+
+    Recognition for a session only needs to score these identities. Changes to
+    ``target_users`` and session deletes invalidate the entry in the process
+    that made them; ``ttl`` bounds staleness for other worker processes.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'FACE_SESSION_CANDIDATES_TTL', 60)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, session):
+        """Target user ids (as strings) for a session instance or session id"""
+        session_id = str(getattr(session, 'pk', session))
+        entry = self._entries.get(session_id)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+
+        from attendance.models import AttendanceSession
+
+        user_ids = frozenset(
+            str(user_id) for user_id in
+            AttendanceSession.target_users.through.objects
+            .filter(attendancesession_id=session_id)
+            .values_list('user_id', flat=True)
+        )
+        with self._lock:
+            self._entries[session_id] = (user_ids, time.monotonic())
+        return user_ids
+
+    def invalidate(self, session_id=None):
+        with self._lock:
+            if session_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(session_id), None)
+
+
+session_candidates = SessionCandidateCache()
@@ -0,0 +1,259 @@
+# camera/session_worker.py
+import threading
+import time
+from collections import Counter, deque
+
+import cv2
+from django.conf import settings
+from django.db import close_old_connections
+
+from .decoding import decode_image
+from .enrolled_users import enrolled_users
+from .mjpeg_stream import camera_streams
+from .session_candidates import session_candidates
+from .timing import StageTimer
+
+DIFF_SIZE = (64, 48)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class SessionRecognitionWorker:
+    """Recognises faces from a session's ESP32 stream until stopped
+
+    Frames are sampled at ``frame_rate``. A frame that barely differs from the
+    last recognised one is skipped, except that at most ``max_skipped`` frames
+    in a row are. A user is marked present once recognised in ``min_hits`` of
+    the last ``window`` recognised frames, and new marks are written in
+    batches every ``flush_seconds``.
+    """
+
+    def __init__(self, session_id, esp32_ip, frame_rate=None, min_hits=None, window=None,
+                 diff_threshold=None, max_skipped=None, flush_seconds=None):
+        self.session_id = str(session_id)
+        self.esp32_ip = esp32_ip
+        self.frame_rate = float(frame_rate or _setting('FACE_SESSION_WORKER_FPS', 2))
+        self.min_hits = int(min_hits or _setting('FACE_SESSION_WORKER_MIN_HITS', 3))
+        self.window = max(self.min_hits, int(window or _setting('FACE_SESSION_WORKER_WINDOW', 5)))
+        self.diff_threshold = float(
+            diff_threshold if diff_threshold is not None else _setting('FACE_SESSION_WORKER_DIFF_THRESHOLD', 4.0)
+        )
+        self.max_skipped = int(max_skipped if max_skipped is not None else _setting('FACE_SESSION_WORKER_MAX_SKIPPED', 10))
+        self.flush_seconds = float(flush_seconds or _setting('FACE_SESSION_WORKER_FLUSH_SECONDS', 2))
+
+        self.started_at = None
+        self.stopped_at = None
+        self.frames_processed = 0
+        self.frames_skipped = 0
+        self.frames_missed = 0
+        self.faces_detected = 0
+        self.users_marked = 0
+        self.processing_seconds = 0.0
+        self.last_error = None
+
+        self._recent_hits = deque(maxlen=self.window)
+        self._marked = set()
+        self._pending = set()
+        self._last_thumbnail = None
+        self._skipped_in_row = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running():
+            return
+        self._stop.clear()
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._thread = threading.Thread(
+            target=self.run_forever, name=f'session-recognition-{self.session_id}', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None and timeout is not None:
+            self._thread.join(timeout)
+
+    def run_forever(self):
+        from .models import CameraConfiguration
+
+        camera = None
+        owns_stream = False
+        try:
+            stream = camera_streams.for_ip(self.esp32_ip)
+            if stream is None:
+                # Read-only lookup; an unregistered camera gets an unsaved configuration for its stream
+                camera = (
+                    CameraConfiguration.objects.filter(ip_address=self.esp32_ip).order_by('created_at').first()
+                    or CameraConfiguration(ip_address=self.esp32_ip, name=f"ESP32-CAM-{self.esp32_ip}")
+                )
+                owns_stream = camera_streams.get(camera.id) is None
+                stream = camera_streams.start(camera)
+
+            interval = 1.0 / self.frame_rate
+            last_flush = time.monotonic()
+            next_tick = time.monotonic()
+            while not self._stop.is_set():
+                next_tick += interval
+                self._process(stream, timeout=interval)
+
+                if time.monotonic() - last_flush >= self.flush_seconds:
+                    close_old_connections()
+                    self._flush()
+                    last_flush = time.monotonic()
+
+                # Sample at frame_rate; if recognition falls behind, carry on without sleeping
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    self._stop.wait(delay)
+                else:
+                    next_tick = time.monotonic()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Session recognition worker {self.session_id} failed: {str(e)}")
+        finally:
+            try:
+                close_old_connections()
+                self._flush()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Session recognition worker {self.session_id}: could not save attendance: {str(e)}")
+            if owns_stream:
+                camera_streams.stop(camera.id)
+            self.stopped_at = time.time()
+            close_old_connections()
+
+    def _is_near_duplicate(self, image):
+        """Cheap change check on a small grayscale thumbnail"""
+        thumbnail = cv2.resize(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), DIFF_SIZE, interpolation=cv2.INTER_AREA)
+        previous = self._last_thumbnail
+        if previous is not None and self._skipped_in_row < self.max_skipped:
+            if float(cv2.absdiff(thumbnail, previous).mean()) < self.diff_threshold:
+                self._skipped_in_row += 1
+                return True
+        self._last_thumbnail = thumbnail
+        self._skipped_in_row = 0
+        return False
+
+    def _process(self, stream, timeout):
+        from .model_handle import face_recognition_model
+
+        max_age = _setting('CAMERA_STREAM_MAX_FRAME_AGE', 2.0)
+        streamed = stream.frames.latest(timeout=timeout, max_age=max_age)
+        if streamed is None:
+            self.frames_missed += 1
+            return
+
+        image = decode_image(streamed[1])
+        if image is None:
+            self.frames_missed += 1
+            return
+
+        if self._is_near_duplicate(image):
+            self.frames_skipped += 1
+            return
+
+        start_time = time.perf_counter()
+        candidates = session_candidates.get(self.session_id) & enrolled_users.get()
+        recognised = set()
+        if candidates and face_recognition_model.is_ready():
+            timer = StageTimer()
+            with timer.stage('detect'):
+                faces = face_recognition_model.detect_faces(image)
+            self.faces_detected += len(faces)
+            if len(faces):
+                results = face_recognition_model.recognize_face(
+                    image,
+                    threshold=face_recognition_model.match_threshold,
+                    timer=timer,
+                    faces=faces,
+                    candidates=candidates
+                )
+                recognised = set(result['label'] for result in results)
+
+        self.processing_seconds += time.perf_counter() - start_time
+        self.frames_processed += 1
+
+        self._recent_hits.append(recognised)
+        hits = Counter(user_id for frame_hits in self._recent_hits for user_id in frame_hits)
+        for user_id, count in hits.items():
+            if count >= self.min_hits and user_id not in self._marked:
+                self._marked.add(user_id)
+                self._pending.add(user_id)
+
+    def _flush(self):
+        """Write attendance for users confirmed since the last flush in one statement"""
+        if not self._pending:
+            return
+
+        from attendance.marking import mark_users
+        from attendance.models import AttendanceSession
+
+        pending, self._pending = self._pending, set()
+        session = AttendanceSession.objects.only('id', 'is_finished').get(id=self.session_id)
+        if session.is_finished:
+            self._stop.set()
+            return
+
+        mark_users(session, pending, is_present=True)
+        self.users_marked += len(pending)
+
+    def status(self):
+        elapsed = ((self.stopped_at or time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            'session_id': self.session_id,
+            'esp32_ip': self.esp32_ip,
+            'running': self.is_running(),
+            'frame_rate': self.frame_rate,
+            'min_hits': self.min_hits,
+            'window': self.window,
+            'frames_processed': self.frames_processed,
+            'frames_skipped': self.frames_skipped,
+            'frames_missed': self.frames_missed,
+            'faces_detected': self.faces_detected,
+            'users_marked': self.users_marked,
+            'processed_fps': round(self.frames_processed / elapsed, 2) if elapsed else 0.0,
+            'avg_processing_ms': (
+                round(1000 * self.processing_seconds / self.frames_processed, 1) if self.frames_processed else None
+            ),
+            'elapsed_seconds': round(elapsed, 1),
+            'last_error': self.last_error,
+        }
+
+
+class SessionWorkerManager:
+    """Process-wide registry holding at most one recognition worker per AttendanceSession"""
+
+    def __init__(self):
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def start(self, session, **options):
+        session_id = str(session.id)
+        with self._lock:
+            worker = self._workers.get(session_id)
+            if worker is not None and worker.is_running():
+                return worker
+            worker = SessionRecognitionWorker(session_id, session.esp32_ip, **options)
+            self._workers[session_id] = worker
+            worker.start()
+            return worker
+
+    def stop(self, session_id, timeout=None):
+        with self._lock:
+            worker = self._workers.get(str(session_id))
+        if worker is not None:
+            worker.stop(timeout)
+        return worker
+
+    def get(self, session_id):
+        return self._workers.get(str(session_id))
+
+
+session_workers = SessionWorkerManager()
@@ -1,3 +1,437 @@
-from django.test import TestCase
+import base64
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import timedelta
+from types import SimpleNamespace
 
-# Create your tests here.
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .camera_client import CameraClient
+from .camera_probe import capture_frames
+from .embedding_store import EmbeddingStore
+from .matching import rank_predictions, search_gallery
+from .mjpeg_stream import FrameQueue, MjpegParser, camera_streams
+from .models import TrainingJob
+from .parsers import ImageParser, request_flag, request_param, uploaded_image
+from .training_queue import TrainingWorker
+
+JPEG = b'\xff\xd8\xff\xe0' + b'\x00' * 32 + b'\xff\xd9'
+
+
+class StubCameraHandler(BaseHTTPRequestHandler):
+    """Answers like the ESP32-CAM firmware, replaying any queued error statuses first"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path.startswith('/stream'):
+            return self._stream()
+
+        with self.server.lock:
+            self.server.requests.append((self.path, self.client_address[1]))
+            status = self.server.statuses.pop(0) if self.server.statuses else 200
+
+        body = JPEG if status == 200 else b'busy'
+        self.send_response(status)
+        self.send_header('Content-Type', 'image/jpeg' if status == 200 else 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self):
+        # Hold the response open, like the firmware's endless multipart stream
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/x-mixed-replace;boundary=frame')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while not self.server.stream_closed.wait(0.01):
+                self.wfile.write(mjpeg_part(JPEG) * 100)
+                self.wfile.flush()
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubCameraMixin:
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubCameraHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.statuses = []
+        self.server.stream_closed = threading.Event()
+        self.addCleanup(self.server.stream_closed.set)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.ip_address = f'127.0.0.1:{self.server.server_port}'
+
+
+class CameraClientTests(StubCameraMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = CameraClient(f'127.0.0.1:{self.server.server_port}', pool_size=2, retries=2, backoff=0)
+        self.addCleanup(self.client.close)
+
+    def test_captures_reuse_one_keep_alive_connection(self):
+        for _ in range(3):
+            response = self.client.capture()
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, JPEG)
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len({port for _, port in self.server.requests}), 1)
+
+    def test_retries_503_until_the_camera_answers(self):
+        self.server.statuses = [503, 503]
+
+        response = self.client.capture()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.requests), 3)
+        stats = self.client.stats()
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['errors'], 0)
+
+    def test_returns_the_last_503_once_retries_are_exhausted(self):
+        self.server.statuses = [503, 503, 503, 503]
+
+        response = self.client.capture()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.client.stats()['last_error'], 'HTTP 503')
+
+    def test_open_stream_does_not_starve_captures(self):
+        client = CameraClient(f'127.0.0.1:{self.server.server_port}', pool_size=1, retries=0)
+        self.addCleanup(client.close)
+        stream = client.open_stream(read_timeout=5)
+        self.addCleanup(stream.close)
+        self.addCleanup(self.server.stream_closed.set)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(client.capture(timeout=(1, 2)).status_code)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertEqual(results, [200, 200])
+
+
+class CaptureFramesTests(StubCameraMixin, SimpleTestCase):
+    def test_probes_make_a_single_attempt(self):
+        self.server.statuses = [503]
+
+        frames = capture_frames([self.ip_address], timeout=(1, 2))
+
+        self.assertFalse(frames[self.ip_address]['ok'])
+        self.assertEqual(frames[self.ip_address]['error'], 'HTTP 503')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_streaming_cameras_answer_from_the_stream_consumer(self):
+        camera = SimpleNamespace(id='stub-camera', ip_address=self.ip_address)
+        stream = camera_streams.start(camera)
+        self.addCleanup(camera_streams.stop, camera.id)
+
+        frames = capture_frames([self.ip_address], timeout=(1, 2))
+
+        self.assertTrue(frames[self.ip_address]['ok'])
+        self.assertEqual(frames[self.ip_address]['source'], 'stream')
+        self.assertEqual(frames[self.ip_address]['image'], JPEG)
+        self.assertEqual(self.server.requests, [])
+        self.assertTrue(stream.frames_received)
+
+
+def mjpeg_part(jpeg, content_length=True):
+    headers = b'--frame\r\nContent-Type: image/jpeg\r\n'
+    if content_length:
+        headers += b'Content-Length: %d\r\n' % len(jpeg)
+    return headers + b'\r\n' + jpeg + b'\r\n'
+
+
+class MjpegParserTests(SimpleTestCase):
+    def test_splits_parts_by_content_length_across_chunks(self):
+        second = JPEG[:-2] + b'\x01\xff\xd9'
+        stream = mjpeg_part(JPEG) + mjpeg_part(second)
+        parser = MjpegParser()
+
+        frames = []
+        for start in range(0, len(stream), 7):
+            frames.extend(parser.feed(stream[start:start + 7]))
+
+        self.assertEqual(frames, [JPEG, second])
+
+    def test_falls_back_to_the_jpeg_end_marker(self):
+        parser = MjpegParser()
+
+        frames = parser.feed(mjpeg_part(JPEG, content_length=False) + mjpeg_part(JPEG, content_length=False)[:20])
+
+        self.assertEqual(frames, [JPEG])
+
+    def test_skips_parts_that_are_not_jpeg(self):
+        parser = MjpegParser()
+
+        frames = parser.feed(mjpeg_part(b'not a jpeg') + mjpeg_part(JPEG))
+
+        self.assertEqual(frames, [JPEG])
+
+
+class FrameQueueTests(SimpleTestCase):
+    def test_drops_the_oldest_frame_when_full(self):
+        frames = FrameQueue(maxsize=2)
+        for frame in (b'1', b'2', b'3'):
+            frames.put(frame)
+
+        self.assertEqual(frames.dropped, 1)
+        self.assertEqual(frames.get(timeout=0)[1], b'2')
+
+    def test_latest_discards_older_frames(self):
+        frames = FrameQueue(maxsize=3)
+        for frame in (b'1', b'2', b'3'):
+            frames.put(frame)
+
+        self.assertEqual(frames.latest(timeout=0)[1], b'3')
+        self.assertEqual(len(frames), 0)
+        self.assertEqual(frames.dropped, 2)
+
+    def test_get_times_out_and_skips_stale_frames(self):
+        frames = FrameQueue(maxsize=2)
+        self.assertIsNone(frames.get(timeout=0.01))
+
+        frames.put(b'old')
+        time.sleep(0.02)
+        self.assertIsNone(frames.get(timeout=0, max_age=0.01))
+        self.assertEqual(frames.dropped, 1)
+
+
+class RecoverStaleJobsTests(TestCase):
+    def running_job(self, minutes_ago, request_count=1):
+        return TrainingJob.objects.create(
+            status=TrainingJob.STATUS_RUNNING,
+            started_at=timezone.now() - timedelta(minutes=minutes_ago),
+            request_count=request_count
+        )
+
+    def test_requeues_jobs_running_longer_than_the_stale_limit(self):
+        stale = self.running_job(minutes_ago=30)
+        live = self.running_job(minutes_ago=1)
+
+        recovered = TrainingWorker(stale_seconds=600).recover_stale_jobs()
+
+        self.assertEqual(recovered, 1)
+        stale.refresh_from_db()
+        live.refresh_from_db()
+        self.assertEqual(stale.status, TrainingJob.STATUS_PENDING)
+        self.assertIsNone(stale.started_at)
+        self.assertEqual(live.status, TrainingJob.STATUS_RUNNING)
+
+    def test_folds_stale_jobs_into_the_pending_job(self):
+        pending = TrainingJob.objects.create()
+        stale = self.running_job(minutes_ago=30, request_count=3)
+
+        TrainingWorker(stale_seconds=600).recover_stale_jobs()
+
+        pending.refresh_from_db()
+        stale.refresh_from_db()
+        self.assertEqual(pending.request_count, 4)
+        self.assertEqual(stale.status, TrainingJob.STATUS_FAILED)
+        self.assertEqual(TrainingJob.objects.filter(status=TrainingJob.STATUS_PENDING).count(), 1)
+
+
+class RankPredictionsTests(SimpleTestCase):
+    labels = np.array(['alice', 'bob', 'carol'])
+
+    def test_returns_the_top_k_labels_best_first(self):
+        ranked = rank_predictions(np.array([[0.1, 0.7, 0.2]]), self.labels, top_k=2)
+
+        self.assertEqual([label for label, _ in ranked[0]], ['bob', 'carol'])
+        self.assertAlmostEqual(ranked[0][0][1], 0.7)
+
+    def test_candidates_keep_their_raw_probability(self):
+        ranked = rank_predictions(np.array([[0.1, 0.3, 0.6]]), self.labels, candidates={'alice', 'bob'})
+
+        self.assertEqual(ranked[0][0][0], 'bob')
+        self.assertAlmostEqual(ranked[0][0][1], 0.3)
+
+    def test_face_outside_the_candidate_set_scores_below_the_threshold(self):
+        # Carol's face seen by a camera whose session only expects Alice and Bob
+        ranked = rank_predictions(np.array([[0.04, 0.02, 0.94]]), self.labels, candidates={'alice', 'bob'})
+
+        label, confidence = ranked[0][0]
+        self.assertEqual(label, 'alice')
+        self.assertLess(confidence, 0.5)
+
+    def test_no_matching_candidates_returns_empty_lists(self):
+        ranked = rank_predictions(np.array([[0.5, 0.5, 0.0]] * 2), self.labels, candidates={'dave'})
+
+        self.assertEqual(ranked, [[], []])
+
+
+class SearchGalleryTests(SimpleTestCase):
+    def setUp(self):
+        # Alice has two enrolled images, Bob and Carol one each
+        self.gallery = np.array([
+            [1.0, 0.0, 0.0],
+            [0.8, 0.6, 0.0],
+            [0.0, 1.0, 0.0],
+            [0.0, 0.0, 1.0],
+        ], dtype=np.float32)
+        self.identities, self.inverse = np.unique(np.array(['alice', 'alice', 'bob', 'carol']), return_inverse=True)
+
+    def search(self, query, **options):
+        return search_gallery(np.array(query, dtype=np.float32), self.gallery, self.identities, self.inverse, **options)
+
+    def test_returns_each_identity_once_scored_by_its_best_image(self):
+        matches = self.search([0.6, 0.8, 0.0], top_k=3)[0]
+
+        self.assertEqual([label for label, _ in matches], ['alice', 'bob', 'carol'])
+        self.assertAlmostEqual(matches[0][1], 0.96, places=5)
+        self.assertAlmostEqual(matches[1][1], 0.8, places=5)
+
+    def test_top_k_limits_each_query(self):
+        results = self.search([[1.0, 0.0, 0.0], [0.1, 0.0, 0.99]], top_k=2)
+
+        self.assertEqual([[label for label, _ in matches] for matches in results], [['alice', 'bob'], ['carol', 'alice']])
+
+    def test_threshold_drops_weak_matches(self):
+        matches = self.search([0.6, 0.8, 0.0], top_k=3, threshold=0.85)[0]
+
+        self.assertEqual([label for label, _ in matches], ['alice'])
+
+    def test_candidates_restrict_the_search(self):
+        matches = self.search([1.0, 0.0, 0.0], top_k=3, candidates={'bob', 'carol'})[0]
+
+        self.assertEqual([label for label, _ in matches], ['bob', 'carol'])
+        self.assertEqual(self.search([1.0, 0.0, 0.0], candidates={'dave'}), [[]])
+
+    def test_empty_gallery_matches_nothing(self):
+        results = search_gallery(np.ones((2, 3)), np.zeros((0, 0)), np.array([]), np.array([], dtype=int))
+
+        self.assertEqual(results, [[], []])
+
+
+class EmbeddingStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def store(self, version='v1'):
+        return EmbeddingStore(self.directory, version=version)
+
+    def test_saved_rows_reload_memory_mapped(self):
+        with self.store().transaction() as store:
+            store.add(['face-1', 'face-2'], ['alice', 'bob'], np.eye(2, 3))
+
+        reloaded = self.store()
+        self.assertTrue(reloaded.load())
+        self.assertIsInstance(reloaded.matrix.base, np.memmap)
+        self.assertEqual(reloaded.keys, ['face-1', 'face-2'])
+        self.assertEqual(reloaded.label_of('face-2'), 'bob')
+        np.testing.assert_array_equal(reloaded.matrix, np.eye(2, 3))
+
+    def test_writes_after_a_load_leave_the_file_untouched(self):
+        with self.store().transaction() as store:
+            store.add(['face-1'], ['alice'], np.ones((1, 3)))
+
+        reloaded = self.store()
+        reloaded.load()
+        reloaded.add(['face-2'], ['bob'], np.zeros((1, 3)))
+
+        on_disk = self.store()
+        on_disk.load()
+        self.assertEqual(len(on_disk), 1)
+        self.assertEqual(len(reloaded), 2)
+
+    def test_remove_moves_the_last_row_into_the_hole(self):
+        store = self.store()
+        store.add(['a', 'b', 'c'], ['alice', 'bob', 'carol'], np.eye(3))
+
+        self.assertEqual(store.remove(['a', 'missing']), 1)
+        self.assertEqual(store.keys, ['c', 'b'])
+        np.testing.assert_array_equal(store.matrix, np.eye(3)[[2, 1]])
+        self.assertNotIn('a', store)
+
+    def test_adding_an_existing_key_replaces_its_row(self):
+        store = self.store()
+        store.add(['a'], ['alice'], np.ones((1, 2)))
+        store.add(['a'], ['bob'], np.zeros((1, 2)))
+
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.label_of('a'), 'bob')
+
+    def test_transaction_keeps_rows_saved_by_another_process(self):
+        first, second = self.store(), self.store()
+        with first.transaction() as store:
+            store.add(['face-1'], ['alice'], np.ones((1, 3)))
+
+        # ``second`` has never seen face-1 but reloads it before writing
+        with second.transaction() as store:
+            store.add(['face-2'], ['bob'], np.zeros((1, 3)))
+
+        self.assertTrue(first.refresh())
+        self.assertEqual(sorted(first.keys), ['face-1', 'face-2'])
+        self.assertFalse(first.changed_on_disk())
+
+    def test_ignores_a_store_from_another_model_version(self):
+        with self.store().transaction() as store:
+            store.add(['face-1'], ['alice'], np.ones((1, 3)))
+
+        other = self.store(version='v2')
+        self.assertFalse(other.load())
+        self.assertEqual(len(other), 0)
+
+
+class UploadParsingTests(SimpleTestCase):
+    factory = APIRequestFactory()
+
+    def request(self, request):
+        return Request(request, parsers=[JSONParser(), MultiPartParser(), FormParser(), ImageParser()])
+
+    def test_raw_image_body_with_fields_in_the_query_string(self):
+        request = self.request(self.factory.post('/recognize/?top_k=3', JPEG, content_type='image/jpeg'))
+
+        self.assertEqual(uploaded_image(request), JPEG)
+        self.assertEqual(request_param(request, 'top_k'), '3')
+
+    def test_multipart_image_file_with_form_fields(self):
+        request = self.request(self.factory.post('/recognize/', {
+            'image': SimpleUploadedFile('face.jpg', JPEG, content_type='image/jpeg'),
+            'top_k': '2',
+        }, format='multipart'))
+
+        self.assertEqual(uploaded_image(request), JPEG)
+        self.assertEqual(request_param(request, 'top_k'), '2')
+
+    def test_base64_image_data_with_a_data_url_prefix(self):
+        image_data = 'data:image/jpeg;base64,' + base64.b64encode(JPEG).decode()
+        request = self.request(self.factory.post('/recognize/', {'image_data': image_data}, format='json'))
+
+        self.assertEqual(uploaded_image(request), JPEG)
+
+    def test_missing_image_returns_none(self):
+        self.assertIsNone(uploaded_image(self.request(self.factory.post('/recognize/', {}, format='json'))))
+        self.assertIsNone(uploaded_image(self.request(self.factory.post('/recognize/', b'', content_type='image/jpeg'))))
+
+    def test_request_flag_parses_strings_and_booleans(self):
+        def flag(data):
+            return request_flag(self.request(self.factory.post('/probe/', data, format='json')), 'include_inactive')
+
+        self.assertFalse(flag({'include_inactive': 'false'}))
+        self.assertTrue(flag({'include_inactive': 'true'}))
+        self.assertTrue(flag({'include_inactive': True}))
+        self.assertFalse(flag({}))
+        with self.assertRaises(ValueError):
+            flag({'include_inactive': 'maybe'})
@@ -0,0 +1,26 @@
+# camera/timing.py
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Accumulates wall-clock milliseconds per named pipeline stage"""
+
+    def __init__(self):
+        self.stages = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def as_dict(self):
+        """Stage timings in milliseconds, plus the total since the timer was created"""
+        timings = {name: round(ms, 2) for name, ms in self.stages.items()}
+        timings['total'] = round((time.perf_counter() - self._start) * 1000, 2)
+        return timings
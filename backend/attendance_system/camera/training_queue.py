@@ -0,0 +1,200 @@
+# camera/training_queue.py
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .dataset import build_dataset
+from .models import TrainingJob
+
+
+def enqueue_training(reason='manual'):
+    """Queue a full retrain, folding it into a job that is still waiting to run
+
+    Rapid enrolments therefore share one pending job instead of each
+    triggering its own retrain.
+    """
+    with transaction.atomic():
+        job = (
+            TrainingJob.objects.select_for_update()
+            .filter(status=TrainingJob.STATUS_PENDING)
+            .order_by('created_at')
+            .first()
+        )
+        if job is not None:
+            job.request_count += 1
+            job.save(update_fields=['request_count'])
+        else:
+            job = TrainingJob.objects.create(reason=reason)
+
+    if getattr(settings, 'FACE_TRAINING_WORKER_IN_PROCESS', True):
+        training_worker.start()
+    training_worker.notify()
+    return job
+
+
+class TrainingWorker:
+    """Background thread that runs queued TrainingJobs one at a time
+
+    After being woken the worker waits ``coalesce_seconds`` so a burst of
+    enrolments lands in the same pending job. It also polls the table every
+    ``poll_seconds`` to pick up jobs queued by other processes. Jobs left
+    RUNNING for longer than ``stale_seconds`` by a worker that died are put
+    back in the queue when a worker starts.
+    """
+
+    def __init__(self, coalesce_seconds=None, poll_seconds=None, stale_seconds=None):
+        self.coalesce_seconds = (
+            coalesce_seconds if coalesce_seconds is not None
+            else getattr(settings, 'FACE_TRAINING_COALESCE_SECONDS', 10)
+        )
+        self.poll_seconds = poll_seconds or getattr(settings, 'FACE_TRAINING_POLL_SECONDS', 30)
+        self.stale_seconds = stale_seconds or getattr(settings, 'FACE_TRAINING_STALE_SECONDS', 2 * 60 * 60)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker thread if it is not already running"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name='face-training-worker', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def notify(self):
+        self._wake.set()
+
+    def recover_stale_jobs(self):
+        """Requeue RUNNING jobs whose worker died, returning how many were recovered
+
+        A job counts as abandoned once it has been running for longer than
+        ``stale_seconds``. It rejoins the pending job if there is one and is
+        marked FAILED, otherwise it goes back to PENDING.
+        """
+        close_old_connections()
+        cutoff = timezone.now() - timedelta(seconds=self.stale_seconds)
+
+        with transaction.atomic():
+            stale = list(
+                TrainingJob.objects.select_for_update()
+                .filter(status=TrainingJob.STATUS_RUNNING, started_at__lt=cutoff)
+                .order_by('created_at')
+            )
+            if not stale:
+                return 0
+
+            pending = (
+                TrainingJob.objects.select_for_update()
+                .filter(status=TrainingJob.STATUS_PENDING)
+                .order_by('created_at')
+                .first()
+            )
+            for job in stale:
+                print(f"Recovering training job {job.id}, running since {job.started_at}")
+                if pending is None:
+                    job.status = TrainingJob.STATUS_PENDING
+                    job.started_at = None
+                    job.save(update_fields=['status', 'started_at'])
+                    pending = job
+                else:
+                    pending.request_count += job.request_count
+                    pending.save(update_fields=['request_count'])
+                    job.status = TrainingJob.STATUS_FAILED
+                    job.error = 'Worker stopped before the job finished; requeued'
+                    job.finished_at = timezone.now()
+                    job.save(update_fields=['status', 'error', 'finished_at'])
+
+        return len(stale)
+
+    def run_forever(self):
+        try:
+            self.recover_stale_jobs()
+        except Exception as e:
+            print(f"Could not recover stale training jobs: {str(e)}")
+
+        while not self._stop.is_set():
+            woken = self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+            if woken and self.coalesce_seconds:
+                # Give closely spaced requests time to join the pending job
+                self._stop.wait(self.coalesce_seconds)
+
+            while not self._stop.is_set() and self.run_pending():
+                pass
+
+    def _claim(self):
+        """Atomically move the oldest pending job to RUNNING"""
+        with transaction.atomic():
+            job = (
+                TrainingJob.objects.select_for_update()
+                .filter(status=TrainingJob.STATUS_PENDING)
+                .order_by('created_at')
+                .first()
+            )
+            if job is None:
+                return None
+            job.status = TrainingJob.STATUS_RUNNING
+            job.started_at = timezone.now()
+            job.save(update_fields=['status', 'started_at'])
+            return job
+
+    def run_pending(self):
+        """Run the oldest pending job; returns the job, or None if the queue was empty"""
+        from .model_handle import face_recognition_model
+
+        close_old_connections()
+        job = self._claim()
+        if job is None:
+            return None
+
+        print(f"Training job {job.id} started ({job.request_count} request(s) coalesced)")
+        start_time = time.time()
+
+        try:
+            dataset = build_dataset()
+            if len(dataset) < 2:
+                raise ValueError("Need at least 2 face images to train the model")
+            if len(dataset.user_ids) < 2:
+                raise ValueError("Need face images for at least 2 users to train the model")
+
+            def report_progress(done, total):
+                if done == total or done % 100 == 0:
+                    print(f"Training job {job.id}: preprocessed {done}/{total} images")
+
+            # train_model swaps the live model in only once training has finished
+            training_results = face_recognition_model.train_model(dataset.image_paths, dataset.labels, progress=report_progress)
+            training_results['duration_seconds'] = round(time.time() - start_time, 1)
+
+            job.status = TrainingJob.STATUS_SUCCEEDED
+            job.result = training_results
+            print(f"Training job {job.id} finished in {training_results['duration_seconds']}s")
+        except Exception as e:
+            job.status = TrainingJob.STATUS_FAILED
+            job.error = str(e)
+            print(f"Training job {job.id} failed: {str(e)}")
+
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+        close_old_connections()
+
+        # A freshly trained classifier is traced on its first call; keep warm workers warm
+        if job.status == TrainingJob.STATUS_SUCCEEDED and face_recognition_model.warmed_up_at is not None:
+            try:
+                face_recognition_model.warm_up()
+            except Exception as e:
+                print(f"Warm-up after training job {job.id} failed: {str(e)}")
+        return job
+
+
+training_worker = TrainingWorker()
@@ -1,21 +1,31 @@
 # camera/views.py
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
-from .models import CameraConfiguration, FaceImage
-from .serializers import CameraConfigurationSerializer, FaceImageSerializer
+from .models import CameraConfiguration, FaceImage, TrainingJob
+from .serializers import CameraConfigurationSerializer, FaceImageSerializer, TrainingJobSerializer
 from users.models import User
 from urllib.parse import urljoin
 
 import os
 import uuid
-import base64
 import requests
-import cv2
-import numpy as np
 from django.conf import settings
 from datetime import datetime
-from .face_recognition_model import face_recognition_model
+from .model_handle import face_recognition_model, EMBEDDING_MODE
+from .dataset import build_dataset
+from .decoding import decode_image, save_image_bytes
+from .enrolled_users import enrolled_users
+from .session_candidates import session_candidates
+from .camera_client import camera_clients
+from .camera_probe import capture_frames, probe_cameras
+from .face_detector import face_detector
+from .mjpeg_stream import camera_streams
+from .parsers import ImageParser, request_flag, request_param, uploaded_image
+from .preprocessing import crop_largest_face, save_face_crop, face_crop_path
+from .timing import StageTimer
+from .training_queue import enqueue_training
 
 class CameraConfigurationViewSet(viewsets.ModelViewSet):
     queryset = CameraConfiguration.objects.all()
@@ -31,14 +41,14 @@ class CameraConfigurationViewSet(viewsets.ModelViewSet):
         # Try to stop any existing stream first
         try:
             # Use a short timeout since this is just a cleanup step
-            requests.get(f"http://{ip_address}/stopstream", timeout=2)
+            camera_clients.get(ip_address).stop_stream(timeout=2)
         except:
             # It's okay if this fails, we'll continue with the test
             pass
         
         # Try to connect to ESP32-CAM using the capture endpoint
         try:
-            response = requests.get(f"http://{ip_address}/capture", timeout=5)
+            response = camera_clients.get(ip_address).capture(timeout=5)
             
             if response.status_code == 200:
                 config, created = CameraConfiguration.objects.update_or_create(
@@ -76,7 +86,7 @@ class CameraConfigurationViewSet(viewsets.ModelViewSet):
         
         try:
             # Call the ESP32's stopstream endpoint
-            response = requests.get(f"http://{ip_address}/stopstream", timeout=3)
+            response = camera_clients.get(ip_address).stop_stream()
             
             if response.status_code == 200:
                 return Response({
@@ -93,46 +103,156 @@ class CameraConfigurationViewSet(viewsets.ModelViewSet):
                 "success": False,
                 "message": f"Failed to stop stream: {str(e)}"
             }, status=400)
+    
+    @action(detail=False, methods=['post'])
+    def probe(self, request):
+        """Check all active cameras (or every camera with include_inactive) at once"""
+        try:
+            include_inactive = request_flag(request, 'include_inactive')
+        except ValueError as e:
+            return Response({"success": False, "message": str(e)}, status=400)
+        results = probe_cameras(include_inactive=include_inactive)
+        
+        return Response({
+            "success": True,
+            "online": sum(1 for result in results if result['ok']),
+            "offline": sum(1 for result in results if not result['ok']),
+            "cameras": results
+        })
+    
+    @action(detail=False, methods=['post'])
+    def sweep(self, request):
+        """Capture from the cameras of all running ESP32 sessions at once and mark who is present"""
+        from attendance.marking import mark_users
+        from attendance.models import AttendanceSession
+        
+        sessions = AttendanceSession.objects.filter(
+            is_active=True, is_finished=False, camera_mode='ESP32', esp32_ip__isnull=False
+        ).exclude(esp32_ip='')
+        session_ids = request.data.get('session_ids')
+        if session_ids is not None:
+            if not isinstance(session_ids, list):
+                return Response({"success": False, "message": "session_ids must be a list of session ids"}, status=400)
+            try:
+                session_ids = [uuid.UUID(str(session_id)) for session_id in session_ids]
+            except ValueError:
+                return Response({"success": False, "message": "session_ids must contain valid session ids"}, status=400)
+            if session_ids:
+                sessions = sessions.filter(id__in=session_ids)
+        sessions = list(sessions)
+        
+        if not face_recognition_model.is_ready():
+            return Response({"success": False, "message": "Model not trained yet. Please train the model first."}, status=400)
+        
+        timer = StageTimer()
+        with timer.stage('capture'):
+            frames = capture_frames([session.esp32_ip for session in sessions])
+        
+        enrolled = enrolled_users.get()
+        results = []
+        for session in sessions:
+            frame = frames[session.esp32_ip]
+            session_result = {
+                'session_id': str(session.id),
+                'esp32_ip': session.esp32_ip,
+                'captured': frame['ok'],
+                'error': frame['error'],
+                'user_ids': []
+            }
+            results.append(session_result)
+            if not frame['ok']:
+                continue
+            
+            with timer.stage('decode'):
+                image = decode_image(frame['image'])
+            candidates = session_candidates.get(session) & enrolled
+            if image is None or not candidates:
+                continue
+            
+            try:
+                recognized = face_recognition_model.recognize_face(
+                    image,
+                    threshold=face_recognition_model.match_threshold,
+                    timer=timer,
+                    candidates=candidates
+                )
+            except Exception as e:
+                session_result['error'] = str(e)
+                continue
+            
+            user_ids = sorted(set(result['label'] for result in recognized))
+            with timer.stage('mark_attendance'):
+                mark_users(session, user_ids, is_present=True)
+            session_result['user_ids'] = user_ids
+        
+        return Response({
+            "success": True,
+            "sessions": results,
+            "timings": timer.as_dict()
+        })
+    
+    @action(detail=False, methods=['get'])
+    def client_stats(self, request):
+        """Request, error and latency counters of the pooled HTTP client for each camera"""
+        return Response({"success": True, "cameras": camera_clients.stats()})
+    
+    @action(detail=True, methods=['get', 'post', 'delete'])
+    def stream(self, request, pk=None):
+        """Start (POST), stop (DELETE) or inspect (GET) the backend consumer of this camera's MJPEG stream"""
+        camera = self.get_object()
+        
+        if request.method == 'POST':
+            if not camera.is_active:
+                return Response({"success": False, "message": "Camera is not active"}, status=400)
+            stream = camera_streams.start(camera)
+            return Response({"success": True, "stream": stream.status()})
+        
+        if request.method == 'DELETE':
+            stream = camera_streams.stop(camera.id)
+            if stream is None:
+                return Response({"success": False, "message": "Stream is not running"}, status=404)
+            return Response({"success": True, "stream": stream.status()})
+        
+        stream = camera_streams.get(camera.id)
+        return Response({"success": True, "stream": stream.status() if stream else None})
         
     
         
+class TrainingJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status of queued and finished model training jobs"""
+    queryset = TrainingJob.objects.all()
+    serializer_class = TrainingJobSerializer
+
 class FaceRecognitionViewSet(viewsets.ViewSet):
+    # Images may arrive as base64 in JSON, as a multipart upload or as a raw image/jpeg body
+    parser_classes = [JSONParser, MultiPartParser, FormParser, ImageParser]
+    
     @action(detail=False, methods=['post'])
     def register_face(self, request):
-        user_id = request.data.get('user_id')
-        image_data = request.data.get('image_data')  # Base64 encoded image
-        camera_mode = request.data.get('camera_mode', 'WEBCAM')
-        esp32_ip = request.data.get('esp32_ip')
+        user_id = request_param(request, 'user_id')
+        camera_mode = request_param(request, 'camera_mode', 'WEBCAM')
+        esp32_ip = request_param(request, 'esp32_ip')
+        timer = StageTimer()
         
         try:
             user = User.objects.get(id=user_id)
             
-            user_dir = os.path.join(settings.MEDIA_ROOT, str(user.id))
-            os.makedirs(user_dir, exist_ok=True)
-            
-            # Generate filename
+            # Generate filename; the image is only written once it passes every check
             timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
             filename = f"face_{timestamp}.jpg"
-            file_path = os.path.join(user_dir, filename)
+            file_path = os.path.join(settings.MEDIA_ROOT, str(user.id), filename)
             
             # Process image based on camera mode
-            if camera_mode == 'WEBCAM' and image_data:
-                image_data = image_data.split(',')[1] if ',' in image_data else image_data
-                image_binary = base64.b64decode(image_data)
-                
-                # Save image
-                with open(file_path, 'wb') as f:
-                    f.write(image_binary)
+            image_binary = None
+            if camera_mode == 'WEBCAM':
+                image_binary = uploaded_image(request)
                 
             elif camera_mode == 'ESP32' and esp32_ip:
                 try:
-                    # Add a timestamp parameter to avoid caching issues
-                    import time
-                    timestamp_ms = int(time.time() * 1000)
-                    response = requests.get(f"http://{esp32_ip}/capture?t={timestamp_ms}", timeout=5)
+                    with timer.stage('capture'):
+                        response = camera_clients.get(esp32_ip).capture()
                     if response.status_code == 200:
-                        with open(file_path, 'wb') as f:
-                            f.write(response.content)
+                        image_binary = response.content
                     else:
                         return Response({
                             "success": False,
@@ -143,90 +263,82 @@ class FaceRecognitionViewSet(viewsets.ViewSet):
                         "success": False,
                         "message": f"Failed to capture from ESP32-CAM: {str(e)}"
                     }, status=400)
-            else:
+            
+            if image_binary is None:
                 return Response({
                     "success": False,
-                    "message": "Invalid data: image_data required for WEBCAM mode, esp32_ip required for ESP32 mode"
+                    "message": "Invalid data: an image (image_data, multipart image or image/* body) required for WEBCAM mode, esp32_ip required for ESP32 mode"
                 }, status=400)
             
-            image = cv2.imread(file_path)
+            # Decode, detect and crop exactly once; every later step reuses the crop
+            with timer.stage('decode'):
+                image = decode_image(image_binary)
             if image is None:
-                os.remove(file_path)  
                 return Response({
                     "success": False,
                     "message": "Invalid image format or empty image"
                 }, status=400)
-                    
-            # Preprocess the image to improve face detection
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            gray = cv2.equalizeHist(gray)  # Improve contrast
-            
-            # Try to detect faces with optimal parameters
-            face_detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            faces = face_detector.detectMultiScale(
-                gray,
-                scaleFactor=1.05,
-                minNeighbors=3,
-                minSize=(30, 30),
-                flags=cv2.CASCADE_SCALE_IMAGE
-            )
-            
-            # If no faces found, try with more lenient parameters
-            if len(faces) == 0:
-                faces = face_detector.detectMultiScale(
-                    gray,
-                    scaleFactor=1.03,
-                    minNeighbors=2,
-                    minSize=(20, 20),
-                    flags=cv2.CASCADE_SCALE_IMAGE
-                )
+            
+            with timer.stage('detect'):
+                faces = face_detector.detect(image)
+            
+            # Keep the crop of the largest face so training never has to detect it again
+            with timer.stage('crop'):
+                face_crop, _ = crop_largest_face(image, faces)
                 
-            if len(faces) == 0:
-                os.remove(file_path) 
+            if face_crop is None:
                 return Response({
                     "success": False,
-                    "message": "No face detected in the image"
+                    "message": "No face detected in the image",
+                    "timings": timer.as_dict()
                 }, status=400)
             
-            # Check if this face is already registered by another user
-            # Only do this check if the model is already trained
-            if face_recognition_model.model is not None:
-                recognition_results = face_recognition_model.recognize_face(image)
-                
-                if recognition_results:
-                    for result in recognition_results:
-                        recognized_user_id = result['label']
-                        confidence = result['confidence']
-                        
-                        # If high confidence match with a different user
-                        if recognized_user_id != str(user.id) and confidence > 0.8:
-                            try:
-                                other_user = User.objects.get(id=recognized_user_id)
-                                os.remove(file_path)
-                                return Response({
-                                    "success": False,
-                                    "message": "Face appears to be already registered",
-                                    "detected_user": {
-                                        "id": other_user.id,
-                                        "name": other_user.name
-                                    },
-                                    "confidence": confidence
-                                }, status=400)
-                            except User.DoesNotExist:
-                                # This should not happen, but just in case
-                                pass
-            
-            # Create face image record
-            relative_path = os.path.join(str(user.id), filename)
-            face_image = FaceImage.objects.create(
-                user=user,
-                image_path=relative_path,
-                is_primary=FaceImage.objects.filter(user=user).count() == 0  # First image is primary
-            )
-            
-            # Update the face recognition model with the new image
+            # One backbone pass gives the features to enrol and, once a model is
+            # trained, the closest registered users for the duplicate check
+            with timer.stage('embed'):
+                features, candidates = face_recognition_model.analyse_crop(face_crop)
+            
+            with timer.stage('duplicate_check'):
+                enrolled = enrolled_users.get()
+                candidates = [c for c in candidates if c[0] in enrolled]
+                if candidates:
+                    recognized_user_id, confidence = candidates[0]
+                    
+                    # If high confidence match with a different user
+                    if recognized_user_id != str(user.id) and confidence >= face_recognition_model.duplicate_threshold:
+                        other_user = User.objects.filter(id=recognized_user_id).only('id', 'name').first()
+                        if other_user is not None:
+                            return Response({
+                                "success": False,
+                                "message": "Face appears to be already registered",
+                                "detected_user": {
+                                    "id": other_user.id,
+                                    "name": other_user.name
+                                },
+                                "confidence": confidence,
+                                "timings": timer.as_dict()
+                            }, status=400)
+            
+            # Create face image record, keeping the original bytes as the enrolment image
+            with timer.stage('save'):
+                relative_path = os.path.join(str(user.id), filename)
+                save_image_bytes(image_binary, file_path)
+                # Stored at face_crop_path(file_path), where training reads it instead of re-detecting
+                save_face_crop(face_crop, file_path)
+                face_image = FaceImage.objects.create(
+                    user=user,
+                    image_path=relative_path,
+                    is_primary=not FaceImage.objects.filter(user=user).exists()  # First image is primary
+                )
+            
+            # Update the face recognition model with the features computed above
+            training_job = None
             try:
-                face_recognition_model.update_model_for_user(user.id, [file_path])
+                with timer.stage('model_update'):
+                    face_recognition_model.enroll_face(face_image.id, user.id, file_path, features)
+                    if face_recognition_model.mode != EMBEDDING_MODE:
+                        # Retraining the classifier takes minutes, so the background worker does it
+                        training_job = enqueue_training('register_face')
             except Exception as e:
                 print(f"Warning: Could not update face recognition model: {str(e)}")
                 # Continue even if model update fails
@@ -242,7 +354,9 @@ class FaceRecognitionViewSet(viewsets.ViewSet):
                     "path": relative_path,
                     "image_path": image_url,
                     "url": image_url
-                }
+                },
+                "training_job": TrainingJobSerializer(training_job).data if training_job else None,
+                "timings": timer.as_dict()
             })
             
         except User.DoesNotExist:
@@ -252,179 +366,147 @@ class FaceRecognitionViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=['post'])
     def recognize_face(self, request):
-        session_id = request.data.get('session_id')
-        image_data = request.data.get('image_data')  # Base64 encoded image
-        camera_mode = request.data.get('camera_mode', 'WEBCAM')
-        esp32_ip = request.data.get('esp32_ip')
+        session_id = request_param(request, 'session_id')
+        camera_mode = request_param(request, 'camera_mode', 'WEBCAM')
+        esp32_ip = request_param(request, 'esp32_ip')
+        timer = StageTimer()
         
         try:
-            from attendance.models import AttendanceSession, Attendance
+            from attendance.marking import mark_users
+            from attendance.models import AttendanceSession
             
             session = AttendanceSession.objects.get(id=session_id)
             
             if session.is_finished:
                 return Response({"error": "Session is already finished"}, status=400)
             
-            temp_dir = os.path.join(settings.MEDIA_ROOT, 'temp')
-            os.makedirs(temp_dir, exist_ok=True)
-            temp_file = os.path.join(temp_dir, f"temp_{uuid.uuid4()}.jpg")
-            
-            if camera_mode == 'WEBCAM' and image_data:
-                image_data = image_data.split(',')[1] if ',' in image_data else image_data
-                image_binary = base64.b64decode(image_data)
-                
-                with open(temp_file, 'wb') as f:
-                    f.write(image_binary)
+            image_binary = None
+            if camera_mode == 'WEBCAM':
+                image_binary = uploaded_image(request)
                 
             elif camera_mode == 'ESP32' and esp32_ip:
-                try:
-                    import time
-                    timestamp_ms = int(time.time() * 1000)
-                    response = requests.get(f"http://{esp32_ip}/capture?t={timestamp_ms}", timeout=10)
-            
-                    if response.status_code == 200:
-                        with open(temp_file, 'wb') as f:
-                            f.write(response.content)
-                    else:
+                # Take the newest frame from a running stream consumer instead of a fresh capture
+                stream = camera_streams.for_ip(esp32_ip)
+                max_age = getattr(settings, 'CAMERA_STREAM_MAX_FRAME_AGE', 2.0)
+                streamed = stream.frames.latest(timeout=max_age, max_age=max_age) if stream else None
+                
+                if streamed is not None:
+                    image_binary = streamed[1]
+                else:
+                    try:
+                        response = camera_clients.get(esp32_ip).capture()
+                
+                        if response.status_code == 200:
+                            image_binary = response.content
+                        else:
+                            return Response({
+                                "success": False,
+                                "message": f"Failed to capture from ESP32-CAM: HTTP {response.status_code}"
+                            }, status=400)
+                    except requests.exceptions.RequestException as e:
                         return Response({
                             "success": False,
-                            "message": f"Failed to capture from ESP32-CAM: HTTP {response.status_code}"
+                            "message": f"Failed to capture from ESP32-CAM: {str(e)}"
                         }, status=400)
-                except requests.exceptions.RequestException as e:
-                    return Response({
-                        "success": False,
-                        "message": f"Failed to capture from ESP32-CAM: {str(e)}"
-                    }, status=400)
-            else:
+            
+            if image_binary is None:
                 return Response({
                     "success": False,
-                    "message": "Invalid data: image_data required for WEBCAM mode, esp32_ip required for ESP32 mode"
+                    "message": "Invalid data: an image (image_data, multipart image or image/* body) required for WEBCAM mode, esp32_ip required for ESP32 mode"
                 }, status=400)
             
-            input_image = cv2.imread(temp_file)
+            # Decode straight from the request/response buffer; nothing touches the disk
+            with timer.stage('decode'):
+                input_image = decode_image(image_binary)
             if input_image is None:
-                os.remove(temp_file)
                 return Response({
                     "success": False,
                     "message": "Invalid image format or empty image"
                 }, status=400)
             
-            # Preprocess the image to improve face detection
-            gray = cv2.cvtColor(input_image, cv2.COLOR_BGR2GRAY)
-            gray = cv2.equalizeHist(gray)  # Improve contrast
-            
-            # Try to detect faces with multiple parameter sets
-            face_detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            faces = face_detector.detectMultiScale(
-                gray,
-                scaleFactor=1.05,
-                minNeighbors=3,
-                minSize=(30, 30),
-                flags=cv2.CASCADE_SCALE_IMAGE
-            )
-            
-            # If no faces found, try with more lenient parameters
-            if len(faces) == 0:
-                faces = face_detector.detectMultiScale(
-                    gray,
-                    scaleFactor=1.03,
-                    minNeighbors=2,
-                    minSize=(20, 20),
-                    flags=cv2.CASCADE_SCALE_IMAGE
-                )
+            with timer.stage('detect'):
+                faces = face_detector.detect(input_image)
             
             if len(faces) == 0:
-                os.remove(temp_file)
                 return Response({
                     "success": False,
                     "message": "No face detected in the input image",
                     "suggestion": "Please ensure the face is clearly visible, well-lit, and facing the camera"
                 }, status=400)
                     
-            from camera.models import FaceImage
-            
-            users_with_faces = set()
-            for user in session.target_users.all():
-                if FaceImage.objects.filter(user=user).exists():
-                    users_with_faces.add(str(user.id))
+            target_user_ids = session_candidates.get(session)
+            users_with_faces = target_user_ids & enrolled_users.get()
             
             if not users_with_faces:
-                os.remove(temp_file)
                 return Response({
                     "success": False,
                     "message": "No users in this session have registered face images"
                 })
                 
-            # Process each face detected
+            # Classify every detected face in one batch, reusing the detections above
+            # and scoring only the session's enrolled target users
             results = []
             
-            for (x, y, w, h) in faces:
-                # Extract and preprocess the face region
-                face_roi = input_image[y:y+h, x:x+w]
-                face_roi = cv2.resize(face_roi, (224, 224))
-                face_roi = cv2.cvtColor(face_roi, cv2.COLOR_BGR2RGB)
-                
-                # Convert to format expected by face recognition model
-                face = np.expand_dims(face_roi, axis=0)
-                
-                # Use model to predict
-                if face_recognition_model.model is not None:
-                    try:
-                        # Use our existing model's recognize_face method
-                        face_result = face_recognition_model.recognize_face(input_image)
-                        if face_result:
-                            results.extend(face_result)
-                    except Exception as e:
-                        print(f"Error in face recognition: {str(e)}")
-            
-            # Clean up temp file
-            os.remove(temp_file)
-            
-            # Get all users in this session
-            target_users = session.target_users.all()
-            target_user_ids = [str(user.id) for user in target_users]
-            
-            matches = []
-            
-            # Process recognition results
+            if face_recognition_model.is_ready():
+                try:
+                    results = face_recognition_model.recognize_face(
+                        input_image,
+                        threshold=face_recognition_model.match_threshold,
+                        timer=timer,
+                        faces=faces,
+                        candidates=users_with_faces
+                    )
+                except Exception as e:
+                    print(f"Error in face recognition: {str(e)}")
+            
+            # Several faces can resolve to the same person; keep the most confident one
+            best_results = {}
             for face_result in results:
                 user_id = face_result['label']
                 print(f"Recognized user ID: {user_id}")
                 confidence = face_result['confidence']
                 
                 # Only consider high confidence matches for target users with face images
-                if user_id in target_user_ids and user_id in users_with_faces and confidence > 0.7:  # Confidence threshold
-                    try:
-                        user = User.objects.get(id=user_id)
-                        
-                        # Mark attendance for this user
-                        attendance, created = Attendance.objects.update_or_create(
-                            session=session,
-                            user=user,
-                            defaults={'is_present': True}
-                        )
-                        
-                        matches.append({
-                            'user_id': user.id,
-                            'name': user.name,
-                            'uuid': str(user.id),
-                            'confidence': confidence,
-                            'attendance_marked': True
-                        })
-                    except User.DoesNotExist:
+                if user_id in target_user_ids and user_id in users_with_faces and confidence >= face_recognition_model.match_threshold:
+                    if user_id not in best_results or confidence > best_results[user_id]['confidence']:
+                        best_results[user_id] = face_result
+            
+            matches = []
+            
+            with timer.stage('mark_attendance'):
+                users = User.objects.filter(id__in=best_results.keys()).only('id', 'name')
+                users = {str(user.id): user for user in users}
+                for user_id in best_results:
+                    if user_id not in users:
                         print(f"Warning: User with ID {user_id} not found")
+                
+                # One upsert for every face recognised in this frame
+                mark_users(session, users.keys(), is_present=True)
+                
+                for user_id, user in users.items():
+                    face_result = best_results[user_id]
+                    matches.append({
+                        'user_id': user.id,
+                        'name': user.name,
+                        'uuid': str(user.id),
+                        'confidence': face_result['confidence'],
+                        'location': face_result['location'],
+                        'attendance_marked': True
+                    })
             
             if matches:
                 return Response({
                     "success": True,
                     "message": "Face(s) recognized successfully",
-                    "matches": matches
+                    "matches": matches,
+                    "timings": timer.as_dict()
                 })
             else:
                 return Response({
                     "success": False,
                     "message": "No matching faces found in the system",
-                    "suggestion": "Please ensure you are registered in the system and try again with better lighting"
+                    "suggestion": "Please ensure you are registered in the system and try again with better lighting",
+                    "timings": timer.as_dict()
                 })
             
         except AttendanceSession.DoesNotExist:
@@ -435,45 +517,28 @@ class FaceRecognitionViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=['post'])
     def train_model(self, request):
-        """Endpoint to trigger model training on all available face images"""
+        """Endpoint to queue model training on all available face images"""
         try:
-            # Get all users and their face images
-            all_images = []
-            all_labels = []
-            
-            users = User.objects.all()
-            total_images = 0
+            total_images = FaceImage.objects.count()
             
-            for user in users:
-                face_images = FaceImage.objects.filter(user=user)
-                total_images += face_images.count()
-                
-                for face_img in face_images:
-                    img_path = os.path.join(settings.MEDIA_ROOT, face_img.image_path)
-                    if os.path.exists(img_path):
-                        all_images.append(img_path)
-                        all_labels.append(str(user.id))  # Use user ID as label
-            
-            if len(all_images) < 2:
+            if total_images < 2:
                 return Response({
                     "success": False,
                     "message": "Need at least 2 face images to train the model"
                 }, status=400)
             
-            # Train the model
-            training_results = face_recognition_model.train_model(all_images, all_labels)
+            # Training runs in the background worker; poll the job for progress
+            training_job = enqueue_training('manual')
             
             return Response({
                 "success": True,
-                "message": "Model trained successfully",
+                "message": "Model training queued",
                 "details": {
-                    "total_users": users.count(),
-                    "total_images": total_images,
-                    "used_images": len(all_images),
-                    "accuracy": training_results['accuracy'],
-                    "validation_accuracy": training_results['val_accuracy']
-                }
-            })
+                    "total_users": User.objects.count(),
+                    "total_images": total_images
+                },
+                "training_job": TrainingJobSerializer(training_job).data
+            }, status=status.HTTP_202_ACCEPTED)
             
         except Exception as e:
             return Response({
@@ -481,9 +546,43 @@ class FaceRecognitionViewSet(viewsets.ViewSet):
                 "message": f"Error training model: {str(e)}"
             }, status=400)
         
+    @action(detail=False, methods=['get'])
+    def readiness(self, request):
+        """Whether this worker has loaded and warmed the model; 503 until it has, for load balancer checks"""
+        readiness = face_recognition_model.readiness()
+        return Response(readiness, status=200 if readiness['ready'] else 503)
+    
+    @action(detail=False, methods=['post'])
+    def warm_up(self, request):
+        """Load the model if needed and run the warm-up batches now"""
+        batch_sizes = request.data.get('batch_sizes')
+        
+        if batch_sizes is not None:
+            try:
+                if not isinstance(batch_sizes, list):
+                    raise TypeError
+                batch_sizes = [int(size) for size in batch_sizes]
+            except (TypeError, ValueError):
+                return Response({"success": False, "message": "batch_sizes must be a list of integers"}, status=400)
+        
+        try:
+            timings = face_recognition_model.warm_up(batch_sizes)
+        except Exception as e:
+            return Response({
+                "success": False,
+                "message": f"Error warming up model: {str(e)}"
+            }, status=500)
+        
+        return Response({
+            "success": True,
+            "message": "Model warmed up",
+            "timings": timings,
+            "readiness": face_recognition_model.readiness()
+        })
+        
     @action(detail=False, methods=['post'])
     def delete_face_image(self, request):
-        """Delete a face image and retrain the model"""
+        """Delete a face image and queue a model retrain"""
         image_id = request.data.get('image_id')
         
         if not image_id:
@@ -493,13 +592,18 @@ class FaceRecognitionViewSet(viewsets.ViewSet):
             # Get the face image
             face_image = FaceImage.objects.get(id=image_id)
             user = face_image.user
+            # Canonical id (the gallery key); delete() clears the pk and image_id may be formatted differently
+            face_image_id = str(face_image.id)
             
             # Get the actual file path
             image_path = os.path.join(settings.MEDIA_ROOT, face_image.image_path)
             
-            # Delete the file if it exists
+            # Delete the file and its stored face crop if they exist
             if os.path.exists(image_path):
                 os.remove(image_path)
+            crop_path = face_crop_path(image_path)
+            if os.path.exists(crop_path):
+                os.remove(crop_path)
             
             # Delete the database record
             face_image.delete()
@@ -513,34 +617,22 @@ class FaceRecognitionViewSet(viewsets.ViewSet):
             
             # Determine if model needs retraining and what kind of retraining
             model_status = "unchanged"
+            training_job = None
             
-            if total_face_images >= 2:
+            if face_recognition_model.mode == EMBEDDING_MODE:
+                # The embedding gallery drops the row directly, nothing to retrain
+                face_recognition_model.remove_face_images([face_image_id])
+                model_status = "updated"
+            elif total_face_images >= 2:
                 # Collect all remaining face images
-                all_images = []
-                all_labels = []
-                users_with_images = set()
-                
-                for current_user in User.objects.all():
-                    user_face_images = FaceImage.objects.filter(user=current_user)
-                    
-                    # Only include users with at least 1 image
-                    if user_face_images.count() > 0:
-                        users_with_images.add(str(current_user.id))
-                        
-                        for face_img in user_face_images:
-                            img_path = os.path.join(settings.MEDIA_ROOT, face_img.image_path)
-                            if os.path.exists(img_path):
-                                all_images.append(img_path)
-                                all_labels.append(str(current_user.id))
+                dataset = build_dataset()
+                all_images = dataset.image_paths
+                users_with_images = dataset.user_ids
                 
                 if len(all_images) >= 2 and len(users_with_images) >= 2:
-                    # Retrain the model with all remaining images
-                    try:
-                        training_results = face_recognition_model.train_model(all_images, all_labels)
-                        model_status = "retrained"
-                        print(f"Model retrained with {len(all_images)} images for {len(users_with_images)} users")
-                    except Exception as e:
-                        print(f"Warning: Could not retrain face recognition model: {str(e)}")
+                    # Retrain in the background with all remaining images
+                    training_job = enqueue_training('delete_face_image')
+                    model_status = "retraining_queued"
                 elif len(all_images) >= 2 and len(users_with_images) < 2:
                     model_status = "insufficient_users"
                     print("Not enough users with images for meaningful recognition (need at least 2)")
@@ -558,7 +650,8 @@ class FaceRecognitionViewSet(viewsets.ViewSet):
                     "message": "Image deleted successfully. User will no longer be recognized.",
                     "remaining_images": 0,
                     "user_recognizable": False,
-                    "model_status": model_status
+                    "model_status": model_status,
+                    "training_job": TrainingJobSerializer(training_job).data if training_job else None
                 })
             else:
                 return Response({
@@ -566,7 +659,8 @@ class FaceRecognitionViewSet(viewsets.ViewSet):
                     "message": "Image deleted successfully",
                     "remaining_images": remaining_count,
                     "user_recognizable": True,
-                    "model_status": model_status
+                    "model_status": model_status,
+                    "training_job": TrainingJobSerializer(training_job).data if training_job else None
                 })
             
         except FaceImage.DoesNotExist:
@@ -188,6 +188,8 @@ const FaceRegistration = () => {
           // Show model status messages
           if (result.model_status === "retrained") {
             toast.info('Face recognition model has been retrained');
+          } else if (result.model_status === "retraining_queued") {
+            toast.info('Face recognition model will be retrained in the background');
           } else if (result.model_status === "insufficient_users") {
             toast.warning('Not enough users with face images for effective recognition');
           } else if (result.model_status === "insufficient_images") {